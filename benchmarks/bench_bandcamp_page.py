@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+"""
+Bandcamp album page extraction: scan_page() + decode_embedded_json() against the
+previous split() + demjson path.
+
+A synthetic album page is generated unless a saved page is given:
+
+    python benchmarks/bench_bandcamp_page.py
+    python benchmarks/bench_bandcamp_page.py --tracks 40 --padding 2000000
+    python benchmarks/bench_bandcamp_page.py --page album.html
+
+"""
+import argparse
+import html
+import json
+import random
+import re
+import sys
+import timeit
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'src'))
+
+import demjson3
+
+from tomfoolery.scrapers.bandcamp_page import scan_page, decode_embedded_json
+
+ATTRIBUTES = ['data-tralbum', 'data-embed']
+
+
+def generate_page(tracks=20, padding=500_000, seed=0):
+    """
+    Album page with the parts the scraper reads, inside padding HTML of about padding chars.
+
+    """
+    rng = random.Random(seed)
+    trackinfo = [
+        {
+            'id': 1000 + n,
+            'track_id': 1000 + n,
+            'track_num': n + 1,
+            'title': f'Track "{n + 1}" & <more>',
+            'artist': None,
+            'duration': rng.uniform(120, 480),
+            'download_enabled': True,
+            'is_downloadable': True,
+            'file': {'mp3-128': f'https://t4.bcbits.com/stream/{rng.getrandbits(64):x}/mp3-128/{n}'},
+        }
+        for n in range(tracks)
+    ]
+    tralbum = {
+        'artist': 'Some Artist',
+        'album_title': 'Some Album',
+        'album_release_date': '01 Jan 2020 00:00:00 GMT',
+        'url': 'https://artist.bandcamp.com/album/some-album',
+        'trackinfo': trackinfo,
+    }
+    embed = {'tralbum_param': {'name': 'album', 'value': 123}, 'art_id': 456}
+
+    filler_block = '<div class="filler"><p>lorem ipsum dolor sit amet</p><span>"x"</span></div>\n'
+    filler = filler_block * (padding // len(filler_block) // 2)
+    tags = ''.join(f'<a class="tag" href="https://bandcamp.com/tag/t{n}">tag {n}</a>' for n in range(12))
+    return (
+        '<html><head><title>Some Album</title></head><body>\n'
+        + filler
+        + f'<script data-tralbum="{html.escape(json.dumps(tralbum))}" '
+        + f'data-embed="{html.escape(json.dumps(embed))}"></script>\n'
+        + '<div id="tralbumArt">\n'
+        + '    <a class="popupImage" href="https://f4.bcbits.com/img/a123_10.jpg">'
+        + '<img src="https://f4.bcbits.com/img/a123_16.jpg"></a>\n</div>\n'
+        + tags
+        + filler
+        + '</body></html>\n'
+    )
+
+
+def extract_old(text):
+    """
+    The previous extraction: the page is split for each attribute and the artwork,
+    the JSON always decoded by demjson.
+
+    """
+    output = {}
+    for attribute in ATTRIBUTES:
+        embed = text.split(f'{attribute}="')[1]
+        embed = html.unescape(embed.split('"')[0])
+        output.update(demjson3.decode(embed))
+    tags = re.findall(r'<a class="tag" href[^>]+>([^<]+)</a>', text, re.MULTILINE)
+    art_url = text.split('"tralbumArt">')[1].split('">')[0].split('href="')[1]
+    return output, tags, art_url
+
+
+def extract_new(text):
+
+    page = scan_page(text)
+    output = {}
+    for attribute in ATTRIBUTES:
+        output.update(decode_embedded_json(page.attributes[attribute]))
+    return output, page.tags, page.art_url
+
+
+def bench(fn, text, repeat):
+
+    number = 1
+    # at least ~0.2s per measurement
+    while min(timeit.repeat(lambda: fn(text), number=number, repeat=1)) < 0.2:
+        number *= 2
+    return min(timeit.repeat(lambda: fn(text), number=number, repeat=repeat)) / number
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page', help='saved album page, instead of a generated one')
+    parser.add_argument('--tracks', type=int, default=20, help='tracks of the generated page')
+    parser.add_argument('--padding', type=int, default=500_000, help='HTML chars around the data')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = generate_page(args.tracks, args.padding)
+
+    old, new = extract_old(text), extract_new(text)
+    # demjson decodes the floats as Decimal
+    if json.dumps(old, default=float) != json.dumps(new, default=float):
+        sys.exit('The old and new extraction disagree.')
+
+    old_secs = bench(extract_old, text, args.repeat)
+    new_secs = bench(extract_new, text, args.repeat)
+    print(f'page: {len(text):,} chars, {len(new[0].get("trackinfo") or [])} tracks')
+    print(f'split + demjson:              {old_secs * 1000:9.3f} ms')
+    print(f'scan_page + decode_embedded:  {new_secs * 1000:9.3f} ms')
+    print(f'speedup:                      {old_secs / new_secs:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
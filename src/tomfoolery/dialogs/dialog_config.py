@@ -33,21 +33,34 @@ class ConfigDialogUI(QtWidgets.QDialog, Ui_ConfigDialog):
         self.checkBoxArtistFolder.stateChanged.connect(lambda s = state, obj = 'artistFolder': self.setCfg(obj, s))
         state = self.checkboxState(self.checkBoxAlbumFolder)  
         self.checkBoxAlbumFolder.stateChanged.connect(lambda s = state, obj = 'albumFolder': self.setCfg(obj, s))      
+        state = self.checkboxState(self.checkBoxYoutubeMp3)  
+        self.checkBoxYoutubeMp3.stateChanged.connect(lambda s = state, obj = 'youtubeMp3': self.setCfg(obj, s))      
+        state = self.checkboxState(self.checkBoxLinkDuplicates)  
+        self.checkBoxLinkDuplicates.stateChanged.connect(lambda s = state, obj = 'linkDuplicates': self.setCfg(obj, s))      
 
         self.buttonBox.accepted.connect(lambda mode = 'accept': self.save_cfg(mode)) # type: ignore
         self.buttonBox.rejected.connect(lambda mode = 'reject': self.save_cfg(mode)) # type: ignore
 
-        for key in ['albumFolder', 'artistFolder']:                    
+        for key in ['albumFolder', 'artistFolder', 'youtubeMp3', 'linkDuplicates']:                    
             if self.cfg.vargs.get(key):
                 checkBox = getattr(self, f'checkBox{key[0].upper() + key[1:]}')
                 checkBox.setChecked(True)
-                
+
+        self.spinBoxMaxWorkers.setValue(self.cfg.vargs.get('maxWorkers'))
+        self.spinBoxMaxWorkers.valueChanged.connect(lambda v, obj = 'maxWorkers': self.setCfgValue(obj, v))
+        self.spinBoxArtworkMaxSize.setValue(self.cfg.vargs.get('artworkMaxSize'))
+        self.spinBoxArtworkMaxSize.valueChanged.connect(lambda v, obj = 'artworkMaxSize': self.setCfgValue(obj, v))
 
     def setCfg(self, obj=None, s=None):
 
         assert obj in self.cfg.vargs        
         self.vargs_new[obj] = bool(s)
 
+    def setCfgValue(self, obj=None, v=None):
+
+        assert obj in self.cfg.vargs
+        self.vargs_new[obj] = int(v)
+
     def save_cfg(self, mode=None):
 
         if mode == 'accept': 
@@ -6,11 +6,7 @@ from appdirs import user_config_dir
 from PyQt6 import QtGui, QtWidgets
 from PyQt6.QtCore import QDir
 
-from tomfoolery.scrapers import (
-    Bandcamp, 
-    Soundcloud, 
-    Youtube
-)
+from tomfoolery.scrapers import scraper_type, get_scraper
 from tomfoolery.ui import (
     ConsoleUI,
     TracklistUI, 
@@ -26,7 +22,8 @@ from tomfoolery.utils import (
     ImageDownloader, 
     ThumbnailHandler,
     MetadataHandler,
-    UnavailableTracksHandler
+    UnavailableTracksHandler,
+    scan_libraries
 )
 
 if getattr(sys, 'frozen', False):
@@ -76,6 +73,7 @@ class MainUI(ConsoleUI, TracklistUI, MetadataHandler,
 
         self.action_Directories.triggered.connect(self.setDirs) 
         self.action_Config.triggered.connect(self.setConfig) 
+        self.action_Deduplicate.triggered.connect(self.deduplicate) 
         self.scrapeButton.clicked.connect(lambda: self.initScraper()) 
         self.imageDownloader.download_finished.connect(self.handleFinished)
         self.downloadButton.clicked.connect(lambda: self.execScraper()) 
@@ -104,6 +102,14 @@ class MainUI(ConsoleUI, TracklistUI, MetadataHandler,
         # overwrite misc config with the new values
         self.cfg = dialog.cfg
 
+    def deduplicate(self):
+
+        # bulk scan of the download directories, identical files are linked
+        roots = list(self.ssd.download_dirs.values())
+        worker = initWorker(scan_libraries, self.config_dir, roots)
+        worker.signals.worker_error.connect(self.handleError)
+        self.pool.start(worker)
+
     def clearUI(self):
 
         self.clearUIContent()  
@@ -115,13 +121,8 @@ class MainUI(ConsoleUI, TracklistUI, MetadataHandler,
         if not txt:            
             raise Exception("Please supply an artist\'s username or URL!")            
 
-        if 'soundcloud.com' in txt:
-            self.scraper_type = 'soundcloud'  
-        elif 'bandcamp.com' in txt:
-            self.scraper_type = 'bandcamp'        
-        elif any(x in txt for x in ('youtube.com', 'youtu.be')):
-            self.scraper_type = 'youtube'         
-        else:
+        self.scraper_type = scraper_type(txt)
+        if self.scraper_type is None:
             raise Exception('URL format unrecognized.') 
             
         self.com.append_word_bank(txt)
@@ -156,12 +157,8 @@ class MainUI(ConsoleUI, TracklistUI, MetadataHandler,
             self.clearUIContent()
             self.clearUIElements()               
            
-            if self.scraper_type == 'soundcloud':
-                self.scraper = Soundcloud(self.vargs, self.cfg)        
-            elif self.scraper_type == 'bandcamp':
-                self.scraper = Bandcamp(self.vargs, self.cfg)
-            elif self.scraper_type == 'youtube':      
-                self.scraper = Youtube(self.vargs, self.cfg) 
+            # the backend of the scraper is imported on its first use
+            self.scraper = get_scraper(self.scraper_type)(self.vargs, self.cfg)
 
         except Exception as e:
             self.handleError(e)
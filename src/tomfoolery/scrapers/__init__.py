@@ -1,4 +1,63 @@
 #! /usr/bin/env python
-from .scrape_bandcamp import *
-from .scrape_youtube import *
-from .scrape_soundcloud import *
+"""
+Scraper registry.
+
+The scrapers are discovered by URL pattern, a backend module (and its dependencies:
+pytube, soundcloud, demjson, moviepy...) is only imported when first used.
+
+"""
+import importlib
+import threading
+
+# name: (module, class, URL patterns)
+SCRAPERS = {
+    'soundcloud': ('.scrape_soundcloud', 'Soundcloud', ('soundcloud.com',)),
+    'bandcamp': ('.scrape_bandcamp', 'Bandcamp', ('bandcamp.com',)),
+    'youtube': ('.scrape_youtube', 'Youtube', ('youtube.com', 'youtu.be')),
+}
+
+# names imported from the backends on attribute access
+LAZY_ATTRIBUTES = {
+    'Soundcloud': '.scrape_soundcloud',
+    'SoundCloudException': '.scrape_soundcloud',
+    'Bandcamp': '.scrape_bandcamp',
+    'BandcampException': '.scrape_bandcamp',
+    'Youtube': '.scrape_youtube',
+    'YoutubeException': '.scrape_youtube',
+}
+
+_import_lock = threading.Lock()
+
+
+def scraper_type(url):
+    """
+    Returns:
+        str: name of the scraper handling url, None if no scraper matches
+    """
+    for name, (_, _, patterns) in SCRAPERS.items():
+        if any(pattern in url for pattern in patterns):
+            return name
+    return None
+
+
+def get_scraper(name):
+    """
+    Return the scraper class registered as name, its module is imported on the first call.
+
+    """
+    module_name, class_name, _ = SCRAPERS[name]
+    return getattr(import_backend(module_name), class_name)
+
+
+def import_backend(module_name):
+
+    # the scrapers may be first used from worker threads
+    with _import_lock:
+        return importlib.import_module(module_name, __name__)
+
+
+def __getattr__(name):
+
+    if name in LAZY_ATTRIBUTES:
+        return getattr(import_backend(LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
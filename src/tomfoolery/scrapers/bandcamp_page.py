@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+import html
+import json
+import logging
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# tag links, a literal prefix: the regex engine skips ahead to it with a fast search
+TAG_REGEX = re.compile(r'<a class="tag" href[^>]+>([^<]+)</a>')
+ART_REGEX = re.compile(r'\s*<a\b[^>]*?\bhref="([^"]+)"')
+
+BandcampPage = namedtuple('BandcampPage', ['attributes', 'tags', 'art_url'])
+
+
+def attribute_value(text, attribute):
+    """
+    Raw (still escaped) value of the first attribute named attribute, None if missing.
+    The value is sliced out of text, the page is not split and copied.
+
+    """
+    marker = f'{attribute}="'
+    start = text.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = text.find('"', start)
+    return text[start:end] if end >= 0 else None
+
+
+def scan_page(text):
+    """
+    Locate the embedded JSON attributes, the tags and the artwork link of a page.
+    Every lookup is a C-level substring search over the page, none copies it.
+
+    Returns:
+        BandcampPage: raw attribute values by name, tags, artwork URL
+    """
+    attributes = {}
+    for attribute in ['data-tralbum', 'data-embed']:
+        if (value := attribute_value(text, attribute)) is not None:
+            attributes[attribute] = value
+
+    tags = TAG_REGEX.findall(text)
+
+    art_url = None
+    marker = '"tralbumArt">'
+    if (start := text.find(marker)) >= 0:
+        if (match := ART_REGEX.match(text, start + len(marker))) is not None:
+            art_url = match.group(1)
+
+    return BandcampPage(attributes, tags, art_url)
+
+
+def decode_embedded_json(raw):
+    """
+    Decode the JSON of an attribute value.
+
+    The stdlib parser handles nearly every page. The JSON is sometimes "sloppy" though
+    (unquoted keys, trailing commas), the much slower but tolerant demjson is kept
+    for these.
+
+    """
+    embed = html.unescape(raw)
+    try:
+        return json.loads(embed)
+    except ValueError:
+        logger.debug('Embedded JSON rejected by the json module, decoding with demjson.')
+    import demjson3
+    return demjson3.decode(embed)
@@ -1,26 +1,28 @@
 #! /usr/bin/env python
-import demjson3 as demjson
-import html
+import json
 import re
 import requests
-import sys
 import os
 from datetime import datetime
-from mutagen.mp3 import MP3, EasyMP3
-from mutagen.id3 import APIC, WXXX
-from mutagen.id3 import ID3 as OldID3
 from os.path import exists, join
 
 from tomfoolery.utils import (
     console_output, 
     emit_signal, 
-    FilenameHandler  
+    FilenameHandler,
+    TrackExecutor,
+    get_session,
+    get_artwork_cache,
+    get_download_history,
+    deduplicate_download,
+    download_resumable,
+    ResumableException,
+    StagingException,
+    JobContext,
+    TrackTags,
+    write_tags
 )
-
-if sys.version_info.minor < 4:
-    html_unescape = html.parser.HTMLParser().unescape
-else:
-    html_unescape = html.unescape
+from .bandcamp_page import scan_page, decode_embedded_json
 
 
 class BandcampException(Exception):
@@ -45,6 +47,8 @@ class Bandcamp():
 
         self.vargs = vargs
         self.cfg = cfg              
+        # per-job state, several jobs may run at the same time
+        self.job = JobContext(self.vargs['path'])
 
         artist_url = self.vargs['artist_url']
         if 'bandcamp.com' in artist_url or ('://' in artist_url and self.vargs['bandcamp']):
@@ -63,13 +67,15 @@ class Bandcamp():
         or a JSON if we can already parse album/track info from the given url.
         """    
        
-        request = requests.get(self.bc_url)
+        request = get_session().get(self.bc_url)
+        # attributes, tags and artwork are all located in one pass over the page
+        page = scan_page(request.text)
         output = {}
         try:
             for attr in ['data-tralbum', 'data-embed']:
                 output.update(
                     self.extract_embedded_json_from_attribute(
-                        request, attr
+                        page, attr
                     )
                 )
         # if the JSON parser failed, we should consider it's a "/music" page,
@@ -82,21 +88,16 @@ class Bandcamp():
                 album_url = re.sub(r'music/?$', '', self.bc_url) + album
                 album_url_list.append(album_url)
             return album_url_list
-        # if the JSON parser was successful, use a regex to get all tags
-        # from this album/track, join them and set it as the "genre"
-        regex_tags = r'<a class="tag" href[^>]+>([^<]+)</a>'
-        tags = re.findall(regex_tags, request.text, re.MULTILINE)
+        # if the JSON parser was successful, join all the tags
+        # from this album/track and set it as the "genre"
         # make sure we treat integers correctly with join()
         # according to http://stackoverflow.com/a/7323861
         # (very unlikely, but better safe than sorry!)
-        output['genre'] = ' '.join(s for s in tags)
+        output['genre'] = ' '.join(s for s in page.tags)
 
-        try:
-            artUrl = request.text.split("\"tralbumArt\">")[1].split("\">")[0].split("href=\"")[1]
-            output['artFullsizeUrl'] = artUrl
-        except:
+        if page.art_url is None:
             console_output("Couldn't get full artwork.")
-            output['artFullsizeUrl'] = None
+        output['artFullsizeUrl'] = page.art_url
     
         # add missing metadata & mark tracks with attribute 'is_downloadable'
         for idx, track in enumerate(output.get('trackinfo')):            
@@ -111,36 +112,28 @@ class Bandcamp():
         # save metadata
         self.metadata = output
 
-    def extract_embedded_json_from_attribute(self, request, attribute, debug=False):
+    def extract_embedded_json_from_attribute(self, page, attribute, debug=False):
         """
         Extract JSON object embedded in an element's attribute value.
 
-        The JSON is "sloppy". The native python JSON parser often can't deal,
-        so we use the more tolerant demjson instead.
+        The stdlib JSON parser is tried first, demjson only decodes the "sloppy" JSON
+        it rejects.
 
         Args:
-            request (obj:`requests.Response`): HTTP GET response from which to extract
+            page (obj:`BandcampPage`): page scanned by scan_page(), or the HTTP GET
+                response from which to extract
             attribute (str): name of the attribute holding the desired JSON object
             debug (bool, optional): whether to print debug messages
 
         Returns:
             The embedded JSON object as a dict, or None if extraction failed
         """
+        if isinstance(page, requests.Response):
+            page = scan_page(page.text)
         try:
-            embed = request.text.split('{}="'.format(attribute))[1]
-            embed = html_unescape(
-                embed.split('"')[0]
-            )
-            output = demjson.decode(embed)
+            output = decode_embedded_json(page.attributes[attribute])
             if debug:
-                print(
-                    'extracted JSON: '
-                    + demjson.encode(
-                        output,
-                        compactly=False,
-                        indent_amount=2,
-                    )
-                )
+                print('extracted JSON: ' + json.dumps(output, indent=2))
         except Exception as e:
             output = None
             if debug:
@@ -150,7 +143,7 @@ class Bandcamp():
     def execute(self, **kwargs):
     
         self.scrape_bandcamp_url(
-            custom_path=self.vargs['path'],
+            custom_path=self.job.download_path,
             **kwargs
         )
 
@@ -162,90 +155,129 @@ class Bandcamp():
             list: filenames to open
         """    
 
-        filenames = []
-
-        artist = self.metadata.get("artist")
-        album_name = self.metadata.get("album_title")
-            
         if len(self.metadata["trackinfo"]) > 1:
             console_output("Found a playlist.")  
         else: 
             console_output("Found a track.")  
 
-        for idx, track in enumerate(self.metadata["trackinfo"]):
-                       
-            if not track['download_enabled']:
-                continue 
+        tasks = [
+            (idx, track) for idx, track in enumerate(self.metadata["trackinfo"])
+            if track['download_enabled']
+        ]
 
-            console_output(f'Track n°"{idx}".')                 
-            emit_signal(kwargs, 'progress_init', [idx, 100])     
-    
-            filename = join(custom_path, self.sanitize_filename(f'{artist} - {track.get("title")}.mp3'))
-
-            # Metadata correction          
-            fh = FilenameHandler(              
-                dir=custom_path, 
-                cfg=self.cfg,                 
-                filename=filename,
-                track_number=idx,
-                album=album_name,
-                metadata_entries=self.metadata['trackinfo'][idx],
-                man_metadata_entries=self.vargs.get('man_metadata_entries')                
-            )              
-            ret = fh.getOutput()
-            filename, path, album_name = ret.get('filename'), ret.get('dir'), ret.get('album')
-            title = ret.get('title')   
-
-            if exists(filename):
-                emit_signal(kwargs, 'messagebox_set', [idx, f'Track already downloaded.']) 
-                emit_signal(kwargs, 'resize_window')             
-                continue
-
-            if not track['file']: 
-                # message box is already set in the tracklist.py
-                console_output(f'Track unavailable for scraping: "{title}".')                        
-                continue
-            
-            emit_signal(kwargs, 'messagebox_set', [idx, 'Downloading...'])                   
-            emit_signal(kwargs, 'resize_window')                         
-
-            self.download_file(track['file']['mp3-128'], filename, idx, **kwargs)
-
-            emit_signal(kwargs, 'messagebox_set', [idx, 'Setting tags...'])                   
-            emit_signal(kwargs, 'resize_window')   
-
-            album_year = self.metadata['album_release_date']
-            if album_year:
-                album_year = datetime.strptime(album_year, "%d %b %Y %H:%M:%S GMT").year    
-
-            if track["track_num"]:
-                track_number = str(track["track_num"]).zfill(2)
-            else:
-                track_number = None                
-                                
-            try:         
-                filename = self.tag_file(
-                        filename=filename,
-                        artist=artist,
-                        title=title,
-                        album=album_name,
-                        year=album_year,
-                        genre=self.metadata['genre'],
-                        artwork_url=self.metadata['artFullsizeUrl'],
-                        track_number=track_number,
-                        url=self.metadata['url']
-                )                  
-            except Exception as e:
-                raise BandcampException(f'Problem tagging "{title}".')                              
-                                                                                
-            filenames.append(filename)
-            
-            emit_signal(kwargs, 'messagebox_set', [idx, f'Downloaded.\\Downloaded "{ret.get("title", title)}".'])                 
-            emit_signal(kwargs, 'checkbox_set', [idx, False])       
-            emit_signal(kwargs, 'resize_window')                
-             
-        return filenames
+        executor = TrackExecutor(self.cfg)
+        filenames = executor.run(self.scrape_track, tasks, custom_path=custom_path, **kwargs)
+
+        return [filename for filename in filenames if filename is not None]
+
+    def scrape_track(self, idx, track, custom_path='', **kwargs):
+        """
+        Download and tag a single track, runs on the track executor.
+
+        Returns:
+            str: filename, None if the track was skipped
+        """
+
+        artist = self.metadata.get("artist")
+        album_name = self.metadata.get("album_title")
+
+        console_output(f'Track n°"{idx}".')                 
+        emit_signal(kwargs, 'progress_init', [idx, 100])     
+
+        history = get_download_history(self.cfg.config_dir)
+        track_id = track.get('track_id') or track.get('id')
+        if history.contains('bandcamp', track_id):
+            emit_signal(kwargs, 'messagebox_set', [idx, f'Track already downloaded.']) 
+            emit_signal(kwargs, 'resize_window')             
+            return None
+
+        filename = join(custom_path, self.sanitize_filename(f'{artist} - {track.get("title")}.mp3'))
+
+        # Metadata correction          
+        fh = FilenameHandler(              
+            dir=custom_path, 
+            cfg=self.cfg,                 
+            filename=filename,
+            track_number=idx,
+            album=album_name,
+            metadata_entries=self.metadata['trackinfo'][idx],
+            man_metadata_entries=self.vargs.get('man_metadata_entries')                
+        )              
+        ret = fh.getOutput()
+        filename, path, album_name = ret.get('filename'), ret.get('dir'), ret.get('album')
+        title = ret.get('title')   
+
+        if exists(filename):
+            history.record('bandcamp', track_id, filename)
+            emit_signal(kwargs, 'messagebox_set', [idx, f'Track already downloaded.']) 
+            emit_signal(kwargs, 'resize_window')             
+            return None
+
+        if not track['file']: 
+            # message box is already set in the tracklist.py
+            console_output(f'Track unavailable for scraping: "{title}".')                        
+            return None
+        
+        emit_signal(kwargs, 'messagebox_set', [idx, 'Downloading...'])                   
+        emit_signal(kwargs, 'resize_window')                         
+
+        self.download_file(track['file']['mp3-128'], filename, idx, **kwargs)
+
+        emit_signal(kwargs, 'messagebox_set', [idx, 'Setting tags...'])                   
+        emit_signal(kwargs, 'resize_window')   
+
+        album_year = self.metadata['album_release_date']
+        if album_year:
+            album_year = datetime.strptime(album_year, "%d %b %Y %H:%M:%S GMT").year    
+
+        if track["track_num"]:
+            track_number = str(track["track_num"]).zfill(2)
+        else:
+            track_number = None                
+                            
+        try:         
+            filename = self.tag_file(
+                    filename=filename,
+                    artist=artist,
+                    title=title,
+                    album=album_name,
+                    year=album_year,
+                    genre=self.metadata['genre'],
+                    artwork=self.get_artwork(self.metadata['artFullsizeUrl']),
+                    track_number=track_number,
+                    url=self.metadata['url']
+            )                  
+        except Exception as e:
+            raise BandcampException(f'Problem tagging "{title}".', idx=idx)                              
+
+        history.record('bandcamp', track_id, filename)
+        deduplicate_download(self.cfg, filename)
+        
+        emit_signal(kwargs, 'messagebox_set', [idx, f'Downloaded.\\Downloaded "{ret.get("title", title)}".'])                 
+        emit_signal(kwargs, 'checkbox_set', [idx, False])       
+        emit_signal(kwargs, 'resize_window')                
+
+        return filename
     
+    def get_artwork(self, artwork_url):
+        """
+        Cover image from the artwork cache, the album tracks share a single download.
+        """
+        if not artwork_url:
+            return None
+
+        fallback_urls = []
+        if '-large' in artwork_url:
+            # prefer the large image, fall back to the given one
+            fallback_urls.append(artwork_url)
+            artwork_url = artwork_url.replace('-large', '-t500x500')
+
+        return get_artwork_cache(self.cfg.config_dir).get(
+            artwork_url, 
+            fallback_urls, 
+            max_size=self.cfg.vargs.get('artworkMaxSize')
+        )
+
     def download_file(self, url, filename, track_idx=0, session=None, params=None, **kwargs):
         """
         Download an individual file.
@@ -254,108 +286,48 @@ class Bandcamp():
         if url[0:2] == '//':
             url = 'https://' + url[2:]
 
-        # Use a temporary file so that we don't import incomplete files.
-        tmp_path = filename + '.tmp'
-
-        if session and params:
-            r = session.get(url, params=params, stream=True )
-        elif session and not params:
-            r = session.get(url, stream=True )
-        else:
-            r = requests.get(url, stream=True)
-        
-        chunk_size = 1024
-        total_length = int(r.headers.get('content-length', 0)) 
-        p_bar_max = int((total_length / chunk_size) + 1)
-        emit_signal(kwargs, 'progress_init', [track_idx, p_bar_max])
-        
-        p_bar_current_val = 0
-        with open(tmp_path, 'wb') as f:            
-            for chunk in r.iter_content(chunk_size=chunk_size):            
-                if chunk:  # filter out keep-alive new chunks           
-                    p_bar_current_val += 1
-                    emit_signal(kwargs, 'progress_set', [track_idx, p_bar_current_val])
-                    f.write(chunk)
-                    f.flush()
-
-        if p_bar_current_val < p_bar_max:
-            raise BandcampException("Connection closed prematurely, download incomplete.", idx=track_idx) 
+        # A partial file is kept next to filename, so that we don't import incomplete files
+        # and a broken download continues where it stopped.
         try:
-            os.rename(tmp_path, filename)   
-        except OSError:
-            raise BandcampException('Could not rename temp file.')      
+            download_resumable(
+                url, 
+                filename, 
+                session=session, 
+                params=params,
+                progress_init=lambda total: emit_signal(kwargs, 'progress_init', [track_idx, total]),
+                progress_handler=lambda received: emit_signal(kwargs, 'progress_set', [track_idx, received])
+            )
+        except ResumableException as e:
+            raise BandcampException(str(e), idx=track_idx)
+        except StagingException:
+            raise BandcampException('Could not rename temp file.', idx=track_idx)      
+        except OSError as e:
+            raise BandcampException(f'Could not write the file: {e}', idx=track_idx)
 
     @staticmethod
     def tag_file(
             filename=None, artist=None, title=None,
-            year=None, genre=None, artwork_url=None, 
+            year=None, genre=None, artwork=None, 
             album=None, track_number=None, url=None            
     ):
         """
-        Attempt to put ID3 tags on a file.
-       
+        Attempt to put ID3 tags on a file, in a single save.
+
+        Raises:
+            TaggingException: the tags could not be saved
         """
         
-        try:                           
-            audio = EasyMP3(filename)
-            audio.tags = None            
-                
-            audio["artist"] = artist
-            audio["title"] = title 
-            
-            if year:
-                audio["date"] = str(year)
-            if album:
-                audio["album"] = album
-            if track_number:
-                audio["tracknumber"] = track_number
-            if genre:
-                audio["genre"] = genre
-            if url: # saves the tag as WOAR
-                audio["website"] = url
-            audio.save()
-
-            if artwork_url:
-
-                artwork_url = artwork_url.replace('https', 'http')
-                mime = 'image/jpeg'
-                if '.jpg' in artwork_url:
-                    mime = 'image/jpeg'
-                if '.png' in artwork_url:
-                    mime = 'image/png'
-
-                if '-large' in artwork_url:
-                    new_artwork_url = artwork_url.replace('-large', '-t500x500')
-                    try:
-                        image_data = requests.get(new_artwork_url).content
-                    except Exception as e:
-                        # No very large image available.
-                        image_data = requests.get(artwork_url).content
-                else:
-                    image_data = requests.get(artwork_url).content
-
-                audio = MP3(filename, ID3=OldID3)
-                audio.tags.add(
-                    APIC(
-                        encoding=3,  # 3 is for utf-8
-                        mime=mime,
-                        type=3,  # 3 is for the cover image
-                        desc='Cover',
-                        data=image_data
-                    )
-                )
-                audio.save()
-
-            # because there is software that doesn't seem to use WOAR we save url tag again as WXXX
-            if url:
-                audio = MP3(filename, ID3=OldID3)
-                audio.tags.add( WXXX( encoding=3, url=url ) )
-                audio.save()
-
-            return filename                       
-
-        except Exception as e:        
-            return None       
+        tags = TrackTags(
+            title=title,
+            artist=artist,
+            album=album,
+            tracknumber=track_number,
+            date=str(year) if year else None,
+            genre=genre,
+            url=url,
+            artwork=artwork
+        )
+        return write_tags(filename, tags)
 
     def sanitize_filename(self, filename):
         """
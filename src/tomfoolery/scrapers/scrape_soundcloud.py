@@ -6,19 +6,16 @@ import logging
 import mimetypes
 mimetypes.init()
 import os
-import shutil
 import subprocess
-import tempfile
 import time
 import urllib.parse
 import warnings
 import sys
+import threading
+import types
 from dataclasses import asdict
-import mutagen
-from mutagen.easymp4 import EasyMP4
-EasyMP4.RegisterTextKey("website", "purl")
 import requests
-from clint.textui import progress
+from requests import HTTPError
 from pathlib import Path
 from pathvalidate import sanitize_filename
 from soundcloud import (
@@ -33,21 +30,44 @@ from tomfoolery.utils import (
     emit_signal, 
     FilenameHandler,
     FfmpegProcess, 
-    handle_progress_info
+    FfmpegError,
+    handle_progress_info,
+    TrackExecutor,
+    get_session,
+    HlsDownloader,
+    HlsUnsupported,
+    HlsException,
+    ClientIdCache,
+    get_artwork_cache,
+    get_download_history,
+    deduplicate_download,
+    download_resumable,
+    ResumableException,
+    StagedFile,
+    StagingException,
+    publish,
+    JobContext,
+    TrackTags,
+    write_tags,
+    Prefetcher,
+    get_toolchain,
+    ToolchainException
 )
 
 CLIENT_ID = 'a3e059563d7fd3372b49b37f00a00bcf'
 AUTH_TOKEN = None
 NAME_FORMAT = '{title}'
 PLAYLIST_NAME_FORMAT = '{playlist[title]}_{title}'
+# max. number of ids the API accepts in a single "/tracks?ids=" request
+TRACKS_BATCH_SIZE = 50
+# prefetch result of a track found in the download history, nothing to resolve
+ALREADY_DOWNLOADED = object()
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logging.getLogger("requests").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-fileToKeep = []
-
 class SoundCloudException(Exception):
     def __init__(self, message, **kwargs):  
 
@@ -57,6 +77,96 @@ class SoundCloudException(Exception):
             self.idx = idx
 
 
+class RefreshingSoundCloud(SoundCloud):
+    """
+    SoundCloud client which regenerates its client_id when the API answers 401 and
+    retries the request, instead of validating the client_id up front.
+    The last known-good client_id is remembered in the cache.
+    """
+    def __init__(self, client_id, auth_token=None, cache=None):
+
+        self.cache = cache
+        self.refresh_lock = threading.Lock()
+        self.confirmed = False
+
+        super().__init__(client_id, auth_token)
+
+        self.requests = {
+            key: RefreshingRequest(self, request) for key, request in self.requests.items()
+        }
+
+    def refresh_client_id(self, stale_client_id):
+        """
+        Replace a rejected client_id by a dynamically generated one (once for all threads).
+        """
+        with self.refresh_lock:
+            if self.client_id != stale_client_id:
+                # another track already refreshed it
+                return
+            logger.error("Invalid client_id. Using a dynamically generated client_id.")
+            try:
+                self.client_id = self.generate_client_id()
+            except Exception:
+                raise SoundCloudException("Could not generate a new client_id.")
+            self.confirmed = False
+
+    def confirm_client_id(self):
+        """
+        The API accepted the client_id, remember it.
+        """
+        if self.confirmed:
+            return
+        self.confirmed = True
+        if self.cache is not None:
+            self.cache.store(self.client_id)
+
+
+class RefreshingRequest:
+    """
+    Wraps a soundcloud-v2 request object, retries once with a new client_id on 401.
+    """
+    def __init__(self, client, request):
+
+        self.client = client
+        self.request = request
+
+    def __call__(self, *args, **kwargs):
+
+        client_id = self.client.client_id
+        try:
+            result = self.request(*args, **kwargs)
+        except HTTPError as err:
+            if err.response is None or err.response.status_code != 401:
+                raise
+            self.client.refresh_client_id(client_id)
+            result = self.request(*args, **kwargs)
+
+        if isinstance(result, types.GeneratorType):
+            return self.iterate(result, client_id, *args, **kwargs)
+        self.client.confirm_client_id()
+        return result
+
+    def iterate(self, generator, client_id, *args, **kwargs):
+
+        # collection requests only hit the API once they are iterated
+        try:
+            first = next(generator)
+        except StopIteration:
+            return
+        except HTTPError as err:
+            if err.response is None or err.response.status_code != 401:
+                raise
+            self.client.refresh_client_id(client_id)
+            generator = self.request(*args, **kwargs)
+            try:
+                first = next(generator)
+            except StopIteration:
+                return
+        self.client.confirm_client_id()
+        yield first
+        yield from generator
+
+
 class Soundcloud():
 
     def __init__(self, vargs=None, cfg=None):  
@@ -70,6 +180,10 @@ class Soundcloud():
 
         self.thumbnail_url = None
 
+        # session-scoped resolve cache, keyed by the normalized URL
+        self.resolved = {}
+        self.resolve_lock = threading.Lock()
+
         self.setup_args()              
     
     def generate_trackinfo(self, **kwargs):
@@ -78,7 +192,7 @@ class Soundcloud():
         self.metadata['trackinfo'] = []
 
         url = kwargs.get("l")
-        item = self.client.resolve(url)
+        item = self.resolve(url)
         logger.debug(item)
      
         if not item: 
@@ -89,6 +203,7 @@ class Soundcloud():
                 metadata=self.metadata
             )
         elif item.kind == "playlist":     
+            resolve_mini_tracks(self.client, item)
             self.metadata = get_playlist_info(
                 item,            
                 metadata=self.metadata, 
@@ -103,14 +218,26 @@ class Soundcloud():
         # save metadata to kwargs, used when out of the class scope
         self.python_args['metadata'] = self.metadata          
     
+    def resolve(self, url):
+        """
+        Resolve a URL once per session, later calls return the same object.
+        """
+        key = normalize_url(url)
+        with self.resolve_lock:
+            if key not in self.resolved:
+                self.resolved[key] = self.client.resolve(url)
+            return self.resolved[key]
+
     def setup_args(self):
         """
         Main function, parses the URL from command line arguments
         """
 
-        # exit if ffmpeg not installed
-        if not is_ffmpeg_available():
-            raise SoundCloudException("ffmpeg is not installed.")                   
+        # exit if ffmpeg not installed, located once per process
+        try:
+            get_toolchain(self.cfg.config_dir if self.cfg is not None else None)
+        except ToolchainException as e:
+            raise SoundCloudException(str(e))                   
 
         # Parse arguments
         self.arguments = {
@@ -129,19 +256,16 @@ class Soundcloud():
         logger.info("Soundcloud Downloader")
         logger.debug(self.arguments)
             
-        client_id = self.arguments.get("--client-id") or CLIENT_ID
+        # the client_id is validated lazily, on the first API call
+        cache = ClientIdCache(self.cfg.config_dir) if self.cfg is not None else None
+        client_id = (
+            self.arguments.get("--client-id") 
+            or (cache.load() if cache is not None else None) 
+            or CLIENT_ID
+        )
         token = self.arguments.get("--auth-token") or AUTH_TOKEN
         
-        self.client = SoundCloud(client_id, token if token else None)
-        
-        if not self.client.is_client_id_valid():
-            if self.arguments.get("--client-id"):
-                logger.error(f"Invalid client_id specified by --client-id argument. Using a dynamically generated client_id.")
-            elif CLIENT_ID:
-                logger.error(f"Invalid client_id. Using a dynamically generated client_id.")
-            self.client = SoundCloud(None, token if token else None)
-            if not self.client.is_client_id_valid():
-                raise SoundCloudException("Dynamically generated client_id is not valid.")                
+        self.client = RefreshingSoundCloud(client_id, token if token else None, cache=cache)
         
         if token or self.arguments.get("me") and not self.client.is_auth_token_valid():
             if self.arguments.get("--auth-token"):
@@ -162,7 +286,7 @@ class Soundcloud():
             # set url to profile associated with auth token
             self.arguments.get["-l"] = self.client.get_me().permalink_url
         try:
-            self.arguments["-l"] = validate_url(self.client, self.arguments["-l"])
+            self.arguments["-l"] = validate_url(self.client, self.arguments["-l"], resolve=self.resolve)
         except Exception:
             raise               
             
@@ -171,18 +295,14 @@ class Soundcloud():
             key = key.strip("-").replace("-", "_")
             self.python_args[key] = value
             
-        # change download path
+        # download path, the working directory is left alone
         path = self.arguments.get("--path")
-        if os.path.exists(path):
-            try:
-                os.chdir(path)
-            except OSError:
-                raise SoundCloudException('"os.chdir" failed.')
-        else:
+        if not path or not os.path.isdir(path):
             if self.arguments.get("--path"):
                 raise SoundCloudException(f"Invalid download path '{path}' specified by --path argument")
             else:
                 raise SoundCloudException(f"Invalid download path '{path}'")            
+        self.job = JobContext(path)
 
     def execute(self, **kwargs):       
         """
@@ -192,14 +312,16 @@ class Soundcloud():
         kwargs = kwargs | self.python_args
         # variables 'cfg', 'man_metadata_entries', 'path' are being used in the FilenameHandler
         try:
-            kwargs['path'] = self.vargs['path']
+            kwargs['path'] = self.job.download_path
+            kwargs['job'] = self.job
             kwargs['cfg'] = self.cfg
             kwargs['man_metadata_entries'] = self.vargs['man_metadata_entries']
         except KeyError:
             pass
                 
         url = kwargs.get("l")
-        item = self.client.resolve(url)
+        # resolved (with its full playlist tracks) during generate_trackinfo already
+        item = self.resolve(url)
         logger.debug(item)
         if not item:    
             raise SoundCloudException("URL is not valid.")
@@ -209,19 +331,13 @@ class Soundcloud():
             download_track(self.client, item, **kwargs)
         elif item.kind == "playlist":
             console_output("Found a playlist.")
+            resolve_mini_tracks(self.client, item)
             download_playlist(self.client, item, **kwargs) 
         else:       
             raise SoundCloudException(f"Unknown item type {item.kind}")                           
     
         if self.arguments.get("--remove"):
-            remove_files()       
-
-        # go to the original directory
-        if os.getcwd() != kwargs['path']:
-            try:
-                os.chdir(kwargs['path'])
-            except OSError:
-                raise SoundCloudException('"os.chdir" to the SoundCloud downloads directory failed.')
+            remove_files(self.job)       
 
 #######################
 ####### UTILITY #######
@@ -235,6 +351,17 @@ def get_playlist_info(playlist: BasicAlbumPlaylist, metadata: dict, **kwargs):
     try:            
         for idx, track in itertools.islice(enumerate(playlist.tracks, 1), 0, None):
 
+            if isinstance(track, MiniTrack):
+                # stub the API did not resolve, it is fetched again before the download
+                metadata['trackinfo'].append(
+                    {
+                        'artist': metadata['artist'],
+                        'track_num': idx,
+                        'title': str(track.id)
+                    }
+                )
+                continue
+
             ret = parse_title(track.title)  
             title = ret.get("title")  
             artist = metadata['artist'] = ret.get("artist", track.user.username)           
@@ -250,6 +377,34 @@ def get_playlist_info(playlist: BasicAlbumPlaylist, metadata: dict, **kwargs):
         return metadata           
 
 
+def resolve_mini_tracks(client: SoundCloud, playlist: BasicAlbumPlaylist):
+    """
+    Replace the MiniTrack stubs of a playlist with full BasicTrack objects.
+    The stubs are resolved in batched "get_tracks" calls instead of one request per track.
+    Stubs missing from the API response are left untouched.
+    """
+    ids = [track.id for track in playlist.tracks if isinstance(track, MiniTrack)]
+    if not ids:
+        return playlist
+
+    logger.debug(f"Resolving {len(ids)} playlist tracks.")
+    resolved = {}
+    for i in range(0, len(ids), TRACKS_BATCH_SIZE):
+        batch = ids[i:i + TRACKS_BATCH_SIZE]
+        if playlist.secret_token:
+            tracks = client.get_tracks(batch, playlist.id, playlist.secret_token)
+        else:
+            tracks = client.get_tracks(batch)
+        for track in tracks or []:
+            resolved[track.id] = track
+
+    playlist.tracks = [
+        resolved.get(track.id, track) if isinstance(track, MiniTrack) else track
+        for track in playlist.tracks
+    ]
+    return playlist
+
+
 def get_track_info(track: BasicTrack, metadata: dict):
    
     ret = parse_title(track.title) 
@@ -282,12 +437,25 @@ def parse_title(title):
     return {"title": title}
 
 
-def validate_url(client: SoundCloud, url: str):
+def normalize_url(url: str):
+    """
+    Normalize a soundcloud.com url, used as the resolve cache key.
+    """
+    parsed = urllib.parse.urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    for prefix in ("m.", "www."):
+        if netloc.startswith(prefix):
+            netloc = netloc[len(prefix):]
+    return urllib.parse.urlunparse(("https", netloc, parsed.path.rstrip("/"), "", "", ""))
+
+
+def validate_url(client: SoundCloud, url: str, resolve=None):
     """
     If url is a valid soundcloud.com url, return it.
     Otherwise, try to fix the url so that it is valid.
     If it cannot be fixed, exit the program.
     """
+    resolve = resolve or client.resolve
     if url.startswith("https://m.soundcloud.com") or url.startswith("http://m.soundcloud.com") or url.startswith("m.soundcloud.com"):
         url = url.replace("m.", "", 1)
     if url.startswith("https://www.soundcloud.com") or url.startswith("http://www.soundcloud.com") or url.startswith("www.soundcloud.com"):
@@ -300,25 +468,25 @@ def validate_url(client: SoundCloud, url: str):
     
     # see if link redirects to soundcloud.com
     try:
-        resp = requests.get(url)
+        resp = get_session().get(url)
         if url.startswith("https://soundcloud.com") or url.startswith("http://soundcloud.com"):
             return urllib.parse.urljoin(resp.url, urllib.parse.urlparse(resp.url).path)
     except Exception:
         # see if given a username instead of url
-        if client.resolve(f"https://soundcloud.com/{url}"):
+        if resolve(f"https://soundcloud.com/{url}"):
             return f"https://soundcloud.com/{url}"
     
     raise SoundCloudException(f"URL is not valid.")   
 
 
-def remove_files():
+def remove_files(job: JobContext):
     """
     Removes any pre-existing tracks that were not just downloaded
     """
     logger.info("Removing local track files that were not downloaded.")
-    files = [f for f in os.listdir(".") if os.path.isfile(f)]
+    files = [job.path(f) for f in os.listdir(job.download_path) if os.path.isfile(job.path(f))]
     for f in files:
-        if f not in fileToKeep:
+        if not job.is_kept(f):
             os.remove(f)
 
 
@@ -343,27 +511,105 @@ def download_playlist(client: SoundCloud, playlist: BasicAlbumPlaylist, **kwargs
         )
         playlist.tracks = playlist.tracks[: int(kwargs.get("n"))]       
 
-    tracknumber_digits = len(str(len(playlist.tracks)))      
-    for idx, track in itertools.islice(enumerate(playlist.tracks, 1), 0, None):
+    tracknumber_digits = len(str(len(playlist.tracks)))
+    metadata = kwargs.get("metadata")
 
-        # save current track index to the kwargs
-        kwargs['track_number'] = idx
-        
-        metadata = kwargs.get("metadata")
-        if not metadata['trackinfo'][idx - 1].get('download_enabled'):
+    # keyed by the 0-based tracklist row, the executor reports errors on that row
+    tasks = []
+    for row, track in enumerate(playlist.tracks):
+        if not metadata['trackinfo'][row].get('download_enabled'):
             continue
+        tasks.append((row, track))
+
+    def prefetch(row):
+        return prefetch_track(client, playlist, playlist.tracks[row], **kwargs)
+
+    executor = TrackExecutor(kwargs.get('cfg'))
+    # the stream URLs / manifests of the next tracks are resolved while the current ones download
+    with Prefetcher(prefetch, [row for row, _ in tasks], depth=executor.max_workers) as prefetcher:
+        executor.run(
+            download_playlist_track, 
+            tasks, 
+            client=client, 
+            playlist=playlist, 
+            playlist_info=playlist_info, 
+            tracknumber_digits=tracknumber_digits, 
+            prefetcher=prefetcher,
+            **kwargs
+        )
 
-        logger.debug(track)
-        console_output(f'Track n°"{idx}".') 
-        playlist_info["tracknumber"] = str(idx).zfill(tracknumber_digits)
-        if isinstance(track, MiniTrack):
-            if playlist.secret_token:
-                track = client.get_tracks([track.id], playlist.id, playlist.secret_token)[0]
-            else:
-                track = client.get_track(track.id)
 
-        download_track(client, track, playlist_info, kwargs.get("strict_playlist"), **kwargs)   
-           
+def resolve_track(client: SoundCloud, playlist: BasicAlbumPlaylist, track):
+
+    if isinstance(track, MiniTrack):
+        if playlist.secret_token:
+            track = client.get_tracks([track.id], playlist.id, playlist.secret_token)[0]
+        else:
+            track = client.get_track(track.id)
+    return track
+
+
+def prefetch_track(client: SoundCloud, playlist: BasicAlbumPlaylist, track, **kwargs):
+    """
+    Resolve a playlist track ahead of its download: full track, HLS stream URL and manifest
+
+    Returns:
+        dict: prefetched data, ALREADY_DOWNLOADED if the track is in the download history
+    """
+    cfg = kwargs.get('cfg')
+    if cfg is not None and not kwargs.get("overwrite"):
+        if get_download_history(cfg.config_dir).contains('soundcloud', track.id):
+            return ALREADY_DOWNLOADED
+
+    prefetched = {'track': resolve_track(client, playlist, track)}
+    track = prefetched['track']
+    if (
+        track.downloadable
+        and not kwargs.get("onlymp3")
+        and not kwargs.get("no_original")
+    ):
+        # the original file is downloaded, no stream needed
+        return prefetched
+
+    prefetched['transcoding'], _ = select_transcoding(track, **kwargs)
+    prefetched['m3u8_url'] = get_transcoding_m3u8(client, prefetched['transcoding'])
+    try:
+        prefetched['hls'] = HlsDownloader(prefetched['m3u8_url'])
+    except HlsException:
+        pass
+    return prefetched
+
+
+def download_playlist_track(row: int, track, client: SoundCloud, playlist: BasicAlbumPlaylist, 
+                            playlist_info: dict, tracknumber_digits: int, prefetcher=None, **kwargs):
+    """
+    Downloads a single playlist track, runs on the track executor
+    """
+
+    # row is 0-based, the track number 1-based
+    track_number = row + 1
+    # save current track number to the kwargs
+    kwargs['track_number'] = track_number
+    # every track gets its own copy, the track number differs
+    playlist_info = dict(playlist_info)
+
+    logger.debug(track)
+    console_output(f'Track n°"{track_number}".') 
+    playlist_info["tracknumber"] = str(track_number).zfill(tracknumber_digits)
+    prefetched = prefetcher.get(row) if prefetcher is not None else None
+    if prefetched is ALREADY_DOWNLOADED:
+        # skipped without resolving the track, a failed prefetch (None) resolves it below
+        emit_signal(kwargs, 'messagebox_set', [row, f'Track already downloaded.'])
+        emit_signal(kwargs, 'resize_window')
+        return
+    if prefetched:
+        track = prefetched['track']
+        kwargs['prefetched'] = prefetched
+    else:
+        track = resolve_track(client, playlist, track)
+
+    download_track(client, track, playlist_info, kwargs.get("strict_playlist"), **kwargs)   
+
 
 def try_utime(path, filetime):
     try:
@@ -420,17 +666,20 @@ def fetch_original_file(track: BasicTrack, playlist_info: dict, client: SoundClo
         logger.info("Could not get original download link")
         return {'filename': None}
     
-    r = requests.get(url, stream=True)
-    if r.status_code == 401:
+    # only the headers are needed here, the body is fetched by download_original_file()
+    with get_session().get(url, stream=True) as r:
+        status_code, headers = r.status_code, r.headers
+
+    if status_code == 401:
         logger.info("The original file has no download left.")
         return {'filename': None}
 
-    if r.status_code == 404:
+    if status_code == 404:
         logger.info("Could not get name from stream - using basic name")
         return {'filename': None}
 
     # Find filename
-    header = r.headers.get("content-disposition")
+    header = headers.get("content-disposition")
     _, params = cgi.parse_header(header)
     if "filename*" in params:
         encoding, filename = params["filename*"].split("''")
@@ -444,15 +693,18 @@ def fetch_original_file(track: BasicTrack, playlist_info: dict, client: SoundClo
         filename, ext = os.path.splitext(filename)
 
         # Find file extension
-        mime = r.headers.get("content-type")
+        mime = headers.get("content-type")
         ext = ext or mimetypes.guess_extension(mime)
         filename += ext
 
         filename = get_filename(track, filename, playlist_info=playlist_info, **kwargs)
 
     logger.debug(f"filename : {filename}")
+
+    # url is needed in download_original_file()
+    kwargs['original_url'] = url
     
-    return {'filename': None, 'kwargs': kwargs}
+    return {'filename': filename, 'kwargs': kwargs}
 
 
 def download_original_file(track: BasicTrack, filename: str, playlist_info: dict, **kwargs):
@@ -464,46 +716,34 @@ def download_original_file(track: BasicTrack, filename: str, playlist_info: dict
             filename = filename[:-4] + ".flac"
         return (filename, True)
 
-    # Write file
-    r = kwargs.get('request')
-    total_length = int(r.headers.get("content-length"))
-        
-    temp = tempfile.NamedTemporaryFile(delete=False)
-    received = 0  
-    
     if playlist_info is not None:
         idx = int(playlist_info.get('tracknumber')) - 1
     else:
         idx = 0
-  
-    emit_signal(kwargs, 'progress_init', [idx, total_length])  
+
     emit_signal(kwargs, 'resize_window')  
-    with temp as f:
-        for chunk in progress.bar(
-            r.iter_content(chunk_size=1024),
-            expected_size=(total_length / 1024) + 1,
-            hide=True if kwargs.get("hide_progress") else False,
-        ):
-            if chunk:
-                received += len(chunk)
-                emit_signal(kwargs, 'progress_set', [idx, len(chunk)])  
-                f.write(chunk)
-                f.flush()        
+    # Write file, a broken download is resumed from the partial file next time
+    try:
+        download_resumable(
+            kwargs.get('original_url'), 
+            filename,
+            progress_init=lambda total: emit_signal(kwargs, 'progress_init', [idx, total]),
+            progress_handler=lambda received: emit_signal(kwargs, 'progress_set', [idx, received])
+        )
+    except (ResumableException, StagingException) as e:
+        raise SoundCloudException(str(e), idx=idx)             
 
     emit_signal(kwargs, 'checkbox_set', [idx, False])   
-
-    if received != total_length:
-        raise SoundCloudException("Connection closed prematurely, download incomplete.", idx=idx)             
- 
-    shutil.move(temp.name, os.path.join(os.getcwd(), filename))
   
     if kwargs.get("flac") and can_convert(filename):
         logger.info("Converting to .flac.")
         newfilename = limit_filename_length(filename[:-4], ".flac")
 
-        commands = ["ffmpeg", "-i", filename, newfilename, "-loglevel", "error"]
-        logger.debug(f"Commands: {commands}")
-        subprocess.call(commands)
+        with StagedFile(newfilename) as staged:
+            commands = [get_toolchain().ffmpeg, "-i", filename, "-loglevel", "error", staged.path]
+            logger.debug(f"Commands: {commands}")
+            if subprocess.call(commands) != 0:
+                raise SoundCloudException(f'Could not convert "{title}" to FLAC.', idx=idx)
         os.remove(filename)
         filename = newfilename    
 
@@ -516,13 +756,20 @@ def get_transcoding_m3u8(client: SoundCloud, transcoding: Transcoding):
         headers = client.get_default_headers()
         if client.auth_token:
             headers["Authorization"] = f"OAuth {client.auth_token}"
-        r = requests.get(url, params={"client_id": client.client_id}, headers=headers)
+        client_id = client.client_id
+        r = get_session().get(url, params={"client_id": client_id}, headers=headers)
+        if r.status_code == 401 and isinstance(client, RefreshingSoundCloud):
+            client.refresh_client_id(client_id)
+            r = get_session().get(url, params={"client_id": client.client_id}, headers=headers)
         logger.debug(r.url)
         return r.json()["url"]
         
 
-def fetch_hls(track: BasicTrack, playlist_info: dict, **kwargs):
-
+def select_transcoding(track: BasicTrack, **kwargs):
+    """
+    Returns:
+        tuple: (HLS transcoding to download, True if it is aac)
+    """
     if not track.media.transcodings:
         raise SoundCloudException(f"Track {track.permalink_url} has no transcodings available")
     
@@ -551,6 +798,13 @@ def fetch_hls(track: BasicTrack, playlist_info: dict, **kwargs):
             f"Available transcodings: {[t.preset for t in track.media.transcodings if t.format.protocol == 'hls']}"
         )
 
+    return transcoding, aac
+
+
+def fetch_hls(track: BasicTrack, playlist_info: dict, **kwargs):
+
+    transcoding, aac = select_transcoding(track, **kwargs)
+
     filename = get_filename(track, None, aac, playlist_info, **kwargs)
     logger.debug(f"filename : {filename}")
 
@@ -560,6 +814,16 @@ def fetch_hls(track: BasicTrack, playlist_info: dict, **kwargs):
     return {'filename': filename, 'kwargs': kwargs}
 
 
+def track_duration(track: BasicTrack):
+    """
+    Returns:
+        float: duration in seconds, None if unknown
+    """
+    # duration is the one of the stream, full_duration may be longer for previews
+    duration = getattr(track, 'duration', None)
+    return duration / 1000 if duration else None
+
+
 def download_hls(track: BasicTrack, filename: str, playlist_info: dict, client: SoundCloud, **kwargs):
     
     title = track.title   
@@ -567,9 +831,13 @@ def download_hls(track: BasicTrack, filename: str, playlist_info: dict, client:
     if already_downloaded(track, title, filename, **kwargs):
         return (filename, True)    
     
-    # Get the requests stream
-    transcoding = kwargs.get('transcoding') 
-    url = get_transcoding_m3u8(client, transcoding)
+    # Get the requests stream, unless prefetched already
+    prefetched = kwargs.get('prefetched') or {}
+    if prefetched.get('transcoding') is kwargs.get('transcoding') and prefetched.get('m3u8_url'):
+        url = prefetched['m3u8_url']
+    else:
+        url = get_transcoding_m3u8(client, kwargs.get('transcoding'))
+        prefetched = {}
     filename_path = os.path.abspath(filename)  
 
     if playlist_info is not None:
@@ -580,10 +848,44 @@ def download_hls(track: BasicTrack, filename: str, playlist_info: dict, client:
     emit_signal(kwargs, 'progress_init', [idx, 100])  
     emit_signal(kwargs, 'resize_window')  
     
-    process = FfmpegProcess(["ffmpeg", "-i", url, "-c", "copy", filename_path])
-    # Use the run method to run the FFmpeg command.
     kwargs['idx'] = idx
-    process.run(ffmpeg_output_file=filename_path, progress_handler=handle_progress_info, **kwargs)     
+    try:
+        hls = prefetched.get('hls') or HlsDownloader(url)
+    except HlsUnsupported as e:
+        # let ffmpeg fetch the stream itself
+        logger.debug(f"{e} Falling back to ffmpeg.")
+        try:
+            with StagedFile(filename_path) as staged:
+                process = FfmpegProcess(["ffmpeg", "-i", url, "-c", "copy", staged.path], duration=track_duration(track))
+                process.run(progress_handler=handle_progress_info, **kwargs)
+        except FfmpegError as e:
+            raise SoundCloudException(str(e), idx=idx)
+    except (HlsException, requests.RequestException) as e:
+        raise SoundCloudException(str(e), idx=idx)
+    else:
+        part_path = filename_path + '.part'
+        try:
+            hls.download(part_path, progress_handler=lambda p: handle_progress_info(p, **kwargs))
+        except (HlsException, requests.RequestException) as e:
+            raise SoundCloudException(str(e), idx=idx)
+        if hls.needs_remux:
+            # MPEG-TS / fragmented MP4 segments, remux into the final container
+            try:
+                with StagedFile(filename_path) as staged:
+                    process = FfmpegProcess(
+                        ["ffmpeg", "-i", part_path, "-c", "copy", staged.path], 
+                        duration=hls.duration or track_duration(track)
+                    )
+                    process.run(progress_handler=handle_progress_info, **kwargs)
+            except FfmpegError as e:
+                raise SoundCloudException(str(e), idx=idx)
+            finally:
+                os.remove(part_path)
+        else:
+            try:
+                publish(part_path, filename_path)
+            except StagingException:
+                raise SoundCloudException('Could not rename temp file.', idx=idx)
 
     emit_signal(kwargs, 'progress_set', [idx, 100])  
     emit_signal(kwargs, 'checkbox_set', [idx, False])  
@@ -603,6 +905,14 @@ def download_track(client: SoundCloud, track: BasicTrack, playlist_info=None, ex
         title = track.title
         title = title.encode("utf-8", "ignore").decode("utf-8")   
 
+        # Skip if the track id is in the download history, before any request is made
+        cfg = kwargs.get('cfg')
+        history = get_download_history(cfg.config_dir) if cfg is not None else None
+        if history is not None and not kwargs.get("overwrite") and history.contains('soundcloud', track.id):
+            emit_signal(kwargs, 'messagebox_set', [idx, f'Track already downloaded.'])
+            emit_signal(kwargs, 'resize_window')
+            return
+
         # Not streamable
         if not track.streamable:
             logger.warning("Track is not streamable.")
@@ -652,11 +962,9 @@ def download_track(client: SoundCloud, track: BasicTrack, playlist_info=None, ex
         else:
             kwargs['album'] = ret.get('album')
             
-        try:
-            os.chdir(path)
-        except OSError:
-            raise SoundCloudException('"os.chdir" failed.')
-        logger.debug("Downloading to " + os.getcwd() + ".")  
+        # absolute path, tracks are downloaded concurrently so the cwd is left alone
+        filename = os.path.join(path, filename)
+        logger.debug("Downloading to " + path + ".")  
                 
         if mode == 'original_file':
             filename, is_already_downloaded = download_original_file(track, filename, playlist_info, **kwargs)
@@ -666,11 +974,15 @@ def download_track(client: SoundCloud, track: BasicTrack, playlist_info=None, ex
             raise ValueError('Value error, expected "hls" or "original_file".')
         
         if is_already_downloaded:
+            if history is not None:
+                history.record('soundcloud', track.id, filename)
+            if kwargs.get("remove"):
+                kwargs['job'].keep(filename)
             emit_signal(kwargs, 'messagebox_set', [idx, f'Track already downloaded.'])                        
             return               
         
         if kwargs.get("remove"):
-            fileToKeep.append(filename)          
+            kwargs['job'].keep(filename)          
 
         # If file does not exist an error occurred
         if not os.path.isfile(filename):
@@ -702,6 +1014,10 @@ def download_track(client: SoundCloud, track: BasicTrack, playlist_info=None, ex
         # Try to change the real creation date
         filetime = int(time.mktime(track.created_at.timetuple()))
         try_utime(filename, filetime)
+
+        if history is not None:
+            history.record('soundcloud', track.id, filename)
+        deduplicate_download(cfg, filename)
         
         logger.info(f"'{filename}' downloaded.")      
 
@@ -743,117 +1059,58 @@ def already_downloaded(track: BasicTrack, title: str, filename: str, **kwargs):
 
 def set_metadata(track: BasicTrack, filename: str, playlist_info=None, **kwargs):
     """
-    Sets the mp3 file metadata using the Python module Mutagen
+    Sets the file metadata using the shared tagging engine
     """
     logger.info("Setting tags.")
     artwork_url = track.artwork_url
     user = track.user
     if not artwork_url:
         artwork_url = user.avatar_url
-    response = None
+    # every track of the playlist shares the same (downscaled) artwork bytes
+    artwork_urls = []
     if kwargs.get("original_art"):
-        new_artwork_url = artwork_url.replace("large", "original")
-        try:
-            response = requests.get(new_artwork_url, stream=True)
-            if response.headers["Content-Type"] not in (
-                "image/png",
-                "image/jpeg",
-                "image/jpg",
-            ):
-                response = None
-        except Exception:
-            pass
-    if response is None:
-        new_artwork_url = artwork_url.replace("large", "t500x500")
-        response = requests.get(new_artwork_url, stream=True)
-        if response.headers["Content-Type"] not in (
-            "image/png",
-            "image/jpeg",
-            "image/jpg",
-        ):
-            response = None
-    if response is None:
-        logger.error(f"Could not get cover art at {new_artwork_url}")
-    with tempfile.NamedTemporaryFile() as out_file:
-        if response:
-            shutil.copyfileobj(response.raw, out_file)
-            out_file.seek(0)
-
-        track.date = track.created_at.strftime("%Y-%m-%d %H::%M::%S")
-
-        track.artist = user.username
-        if kwargs.get("extract_artist"):
-            for dash in [" - ", " − ", " – ", " — ", " ― "]:
-                if dash in track.title:
-                    artist_title = track.title.split(dash)
-                    track.artist = artist_title[0].strip()
-                    track.title = artist_title[1].strip()
-                    break
-        mutagen_file = mutagen.File(filename)
-        mutagen_file.delete()
-        if track.description:
-            if mutagen_file.__class__ == mutagen.flac.FLAC:
-                mutagen_file["description"] = track.description
-            elif mutagen_file.__class__ == mutagen.mp3.MP3 or mutagen_file.__class__ == mutagen.wave.WAVE:
-                mutagen_file["COMM"] = mutagen.id3.COMM(
-                    encoding=3, lang="ENG", text=track.description
-                )
-            elif mutagen_file.__class__ == mutagen.mp4.MP4:
-                mutagen_file["\xa9cmt"] = track.description
-        if response:
-            if mutagen_file.__class__ == mutagen.flac.FLAC:
-                p = mutagen.flac.Picture()
-                p.data = out_file.read()
-                p.mime = "image/jpeg"
-                p.type = mutagen.id3.PictureType.COVER_FRONT
-                mutagen_file.add_picture(p)
-            elif mutagen_file.__class__ == mutagen.mp3.MP3 or mutagen_file.__class__ == mutagen.wave.WAVE:
-                mutagen_file["APIC"] = mutagen.id3.APIC(
-                    encoding=3,
-                    mime="image/jpeg",
-                    type=3,
-                    desc="Cover",
-                    data=out_file.read(),
-                )
-            elif mutagen_file.__class__ == mutagen.mp4.MP4:
-                mutagen_file["covr"] = [mutagen.mp4.MP4Cover(out_file.read())]
-
-        if mutagen_file.__class__ == mutagen.wave.WAVE:
-            mutagen_file["TIT2"] = mutagen.id3.TIT2(encoding=3, text=track.title)
-            mutagen_file["TPE1"] = mutagen.id3.TPE1(encoding=3, text=track.artist)
-            if track.genre:
-                mutagen_file["TCON"] = mutagen.id3.TCON(encoding=3, text=track.genre)
-            if track.permalink_url:
-                mutagen_file["WOAS"] = mutagen.id3.WOAS(url=track.permalink_url)
-            if track.date:
-                mutagen_file["TDAT"] = mutagen.id3.TDAT(encoding=3, text=track.date)
-            if playlist_info:
-                mutagen_file["TALB"] = mutagen.id3.TALB(encoding=3, text=playlist_info["title"])
-                mutagen_file["TRCK"] = mutagen.id3.TRCK(encoding=3, text=str(playlist_info["tracknumber"]))
-            else:
-                mutagen_file["TALB"] = kwargs.get('album')
-            mutagen_file.save()
-        else:
-            mutagen_file.save()
-            audio = mutagen.File(filename, easy=True)
-            audio["title"] = track.title
-            audio["artist"] = track.artist
-            if track.genre:
-                audio["genre"] = track.genre
-            if track.permalink_url:
-                audio["website"] = track.permalink_url
-            if track.date:
-                audio["date"] = track.date
-            if playlist_info:
-                audio["album"] = playlist_info["title"]
-                audio["tracknumber"] = str(playlist_info["tracknumber"])
-            else:
-                audio["album"] = kwargs.get('album')
-                if (metadata := kwargs.get('metadata')):
-                    if (trackinfo := metadata.get('trackinfo')):
-                        if trackinfo:
-                            audio["tracknumber"] = str(trackinfo[0].get('track_num'))
-            audio.save()
+        artwork_urls.append(artwork_url.replace("large", "original"))
+    artwork_urls.append(artwork_url.replace("large", "t500x500"))
+    cfg = kwargs.get("cfg")
+    artwork = get_artwork_cache(cfg.config_dir).get(
+        artwork_urls[0], 
+        artwork_urls[1:], 
+        max_size=cfg.vargs.get("artworkMaxSize")
+    )
+    if artwork is None:
+        logger.error(f"Could not get cover art at {artwork_urls[-1]}")
+
+    track.date = track.created_at.strftime("%Y-%m-%d %H::%M::%S")
+
+    track.artist = user.username
+    if kwargs.get("extract_artist"):
+        for dash in [" - ", " − ", " – ", " — ", " ― "]:
+            if dash in track.title:
+                artist_title = track.title.split(dash)
+                track.artist = artist_title[0].strip()
+                track.title = artist_title[1].strip()
+                break
+
+    tags = TrackTags(
+        title=track.title,
+        artist=track.artist,
+        genre=track.genre,
+        url=track.permalink_url,
+        date=track.date,
+        description=track.description,
+        artwork=artwork
+    )
+    if playlist_info:
+        tags.album = playlist_info["title"]
+        tags.tracknumber = str(playlist_info["tracknumber"])
+    else:
+        tags.album = kwargs.get('album')
+        if (metadata := kwargs.get('metadata')):
+            if (trackinfo := metadata.get('trackinfo')):
+                tags.tracknumber = str(trackinfo[0].get('track_num'))
+
+    # the whole tag set is written in a single save
+    write_tags(filename, tags)
 
 
 def limit_filename_length(name: str, ext: str, max_bytes=255):
@@ -862,13 +1119,6 @@ def limit_filename_length(name: str, ext: str, max_bytes=255):
     return name + ext
 
 
-def is_ffmpeg_available():
-    """
-    Returns true if ffmpeg is available in the operating system
-    """
-    return shutil.which("ffmpeg") is not None
-
-
 def size_in_bytes(insize):
     """
     Returns the size in bytes from strings such as '5 mb' into 5242880.
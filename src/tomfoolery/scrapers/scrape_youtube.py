@@ -1,18 +1,30 @@
 #! /usr/bin/env python
-from pytube import YouTube, Playlist
 from pytube.exceptions import *
-import subprocess
 import re
 import os
-import requests
 from pathlib import Path
 from pathvalidate import sanitize_filename
-import shutil
 from tomfoolery.utils import (
     console_output, 
     emit_signal, 
-    FilenameHandler
+    FilenameHandler,
+    TrackExecutor,
+    get_artwork_cache,
+    get_download_history,
+    deduplicate_download,
+    JobContext,
+    TrackTags,
+    write_tags,
+    TaggingException,
+    Prefetcher,
+    get_toolchain,
+    ToolchainException,
+    FfmpegProcess,
+    FfmpegError,
+    StagedFile
 )
+from .youtube_playlist import PlaylistListing
+from .youtube_player import CachedYouTube, get_player_cache
 class YoutubeException(Exception):
     def __init__(self, message, **kwargs):  
 
@@ -21,11 +33,23 @@ class YoutubeException(Exception):
         if (idx := kwargs.get('idx')) is not None:      
             self.idx = idx
 
-ffmpeg = shutil.which('ffmpeg')
-if not ffmpeg: 
-    raise Exception("ffmpeg is not installed.")
-os.environ["IMAGEIO_FFMPEG_EXE"] = ffmpeg
-from moviepy.editor import VideoFileClip
+# container the audio stream is copied into, per codec: (extension, ffmpeg muxer)
+REMUX_EXTENSIONS = {
+    'opus': ('.opus', 'opus'),
+    'vorbis': ('.ogg', 'ogg'),
+    'mp4a': ('.m4a', 'ipod'),
+}
+
+
+def find_ffmpeg(config_dir=None):
+
+    try:
+        ffmpeg = get_toolchain(config_dir).ffmpeg
+    except ToolchainException as e:
+        raise YoutubeException(str(e))
+    # used by moviepy, imported once a video has to be converted
+    os.environ["IMAGEIO_FFMPEG_EXE"] = ffmpeg
+    return ffmpeg
 
 
 class Youtube():
@@ -36,12 +60,15 @@ class Youtube():
         self.cfg = cfg
         self.metadata = {}  
 
-        self.download_path = self.vargs['path']
+        self.ffmpeg = find_ffmpeg(self.cfg.config_dir)
+
+        # per-job state, several jobs may run at the same time
+        self.job = JobContext(self.vargs['path'])
+        self.download_path = self.job.download_path
+        # player JS and cipher shared by the videos, kept on disk between runs
+        get_player_cache(self.cfg.config_dir)
         self.url = self.vargs['artist_url']         
 
-        self.default_filename = None
-        self.filename = None   
-              
         self.playlist_title = None
         self.videos = []           
         if 'list' in self.url:
@@ -55,7 +82,7 @@ class Youtube():
 
         if self.type == 'single_track':            
             try:
-                video = YouTube(url)
+                video = CachedYouTube(url)
                 self.videos.append(video)       
             except VideoRegionBlocked:
                 raise YoutubeException(f'Video {url} is blocked in your region, skipping.')   
@@ -82,10 +109,11 @@ class Youtube():
             
         else:                    
             try:
-                p = Playlist(url)
+                # ids, titles and authors come from the playlist pages,
+                # the watch pages are only fetched when a track is downloaded
+                p = PlaylistListing(url)
                 self.playlist_title = p.title
-                for video in p.videos:
-                    self.videos.append(video)
+                self.videos.extend(p.listing())
             except VideoRegionBlocked:
                 raise YoutubeException(f'Video {url} is blocked in your region, skipping.')   
             except VideoPrivate:
@@ -170,153 +198,187 @@ class Youtube():
             )     
 
     def execute(self, **kwargs):        
-     
-        for idx, vid in enumerate(self.videos):
-
-            file = None
-      
-            if not self.metadata['trackinfo'][idx].get('download_enabled'):                   
-                continue
-
-            console_output(f'Track n°"{idx + 1}".') 
-
-            if (audio_streams := vid.streams.filter(only_audio=True)) is not None:
-                sorted_streams = audio_streams.order_by('abr').desc()        
-                file = sorted_streams.first()                
-            else:          
-                if (video_streams := vid.streams.filter(only_audio=False)) is not None:
-                    sorted_streams = video_streams.order_by('fps').desc()        
-                    file = sorted_streams.first()
-
-            filename = sanitize_filename(file.default_filename)
-            self.default_filename = Path(self.download_path).joinpath(filename)      
-            self.filename = Path(self.download_path).joinpath(filename).with_suffix('.mp3')  
-
-            # Metadata correction          
-            fh = FilenameHandler(              
-                dir=self.download_path, 
-                cfg=self.cfg,                 
-                filename=str(self.filename),
-                track_number=idx,
-                album=self.playlist_title,
-                metadata_entries = self.metadata['trackinfo'][idx],
-                man_metadata_entries=self.vargs.get('man_metadata_entries')                
-            )              
-            ret = fh.getOutput()
-            self.filename, self.download_path, metadata = ret.get('filename'), ret.get('dir'), ret.get('metadata') 
-            title = ret.get('title')
-            self.playlist_title = ret.get('album')
-
-            if os.path.isfile(self.filename):                
-                emit_signal(kwargs, 'messagebox_set', [idx, 'Track already downloaded.'])    
-                emit_signal(kwargs, 'resize_window')  
-                continue
-            else: 
-                emit_signal(kwargs, 'messagebox_set', [idx, 'Downloading...']) 
-                emit_signal(kwargs, 'progress_init', [idx, 100]) 
-                emit_signal(kwargs, 'resize_window')  
-
-                file = file.download(output_path=self.download_path)   
-            
-                emit_signal(kwargs, 'progress_set', [idx, 50])  
-                emit_signal(kwargs, 'resize_window')  
 
-                if audio_streams:
-                    ffmpeg_proc = f'{ffmpeg} -y -i "{self.default_filename}" "{self.filename}"'
-                    subprocess.run(ffmpeg_proc, shell=True)
-                elif video_streams:
-                    video = VideoFileClip(file)
-                    audio = video.audio
-                    audio.write_audiofile(self.filename)
-                    audio.close()
-                    video.close()
-                else:
-                    raise Exception('No audio or video streams found.')
-
-                emit_signal(kwargs, 'progress_set', [idx, 75])  
-                emit_signal(kwargs, 'resize_window')  
-                try:
-                    os.remove(file) 
-                except OSError:
-                    raise YoutubeException('Could not remove temp file.')                        
-                            
-            emit_signal(kwargs, 'progress_set', [idx, 85]) 
+        tasks = [
+            (idx, vid) for idx, vid in enumerate(self.videos)
+            if self.metadata['trackinfo'][idx].get('download_enabled')
+        ]
+
+        executor = TrackExecutor(self.cfg)
+        # the streams of the next tracks are resolved while the current ones download
+        with Prefetcher(self.prefetch_streams, [idx for idx, _ in tasks], depth=executor.max_workers) as prefetcher:
+            executor.run(self.download_track, tasks, prefetcher=prefetcher, **kwargs)
+
+    def prefetch_streams(self, idx):
+
+        vid = self.videos[idx]
+        if get_download_history(self.cfg.config_dir).contains('youtube', vid.video_id):
+            return None
+        return self.resolve_streams(vid)
+
+    def resolve_streams(self, vid):
+        """
+        Returns:
+            tuple: (best stream, audio streams, video streams)
+        """
+        file, video_streams = None, None
+
+        if (audio_streams := vid.streams.filter(only_audio=True)) is not None:
+            sorted_streams = audio_streams.order_by('abr').desc()        
+            file = sorted_streams.first()                
+        else:          
+            if (video_streams := vid.streams.filter(only_audio=False)) is not None:
+                sorted_streams = video_streams.order_by('fps').desc()        
+                file = sorted_streams.first()
+
+        return file, audio_streams, video_streams
+
+    def download_track(self, idx, vid, prefetcher=None, **kwargs):
+        """
+        Download, convert and tag a single video, runs on the track executor.
+        """
+
+        console_output(f'Track n°"{idx + 1}".') 
+
+        # the stream lookup below already hits the network
+        history = get_download_history(self.cfg.config_dir)
+        if history.contains('youtube', vid.video_id):
+            emit_signal(kwargs, 'messagebox_set', [idx, 'Track already downloaded.'])    
             emit_signal(kwargs, 'resize_window')  
+            return
 
-            self.embed_art(vid.thumbnail_url)
-
-            emit_signal(kwargs, 'messagebox_set', [idx, 'Setting tags...']) 
-            emit_signal(kwargs, 'progress_set', [idx, 95]) 
+        prefetched = prefetcher.get(idx) if prefetcher is not None else None
+        try:
+            file, audio_streams, video_streams = prefetched or self.resolve_streams(vid)
+        except PytubeError as e:
+            raise YoutubeException(f'Video {vid.watch_url} is unavailable: {e}', idx=idx)
+
+        ext = self.output_extension(file)
+        filename = sanitize_filename(file.default_filename)
+        filename = Path(self.download_path).joinpath(filename).with_suffix(ext)  
+
+        # Metadata correction          
+        fh = FilenameHandler(              
+            dir=self.download_path, 
+            cfg=self.cfg,                 
+            filename=str(filename),
+            track_number=idx,
+            album=self.playlist_title,
+            metadata_entries = self.metadata['trackinfo'][idx],
+            man_metadata_entries=self.vargs.get('man_metadata_entries')                
+        )              
+        ret = fh.getOutput()
+        filename, download_path, metadata = ret.get('filename'), ret.get('dir'), ret.get('metadata') 
+        title = ret.get('title')
+        album = ret.get('album')
+
+        if os.path.isfile(filename):                
+            history.record('youtube', vid.video_id, filename)
+            emit_signal(kwargs, 'messagebox_set', [idx, 'Track already downloaded.'])    
             emit_signal(kwargs, 'resize_window')  
-                    
-            self.add_tags(metadata)   
-            
-            emit_signal(kwargs, 'messagebox_set', [idx, f'Downloaded.\Downloaded "{title}".'])  
-            emit_signal(kwargs, 'progress_set', [idx, 100])            
+            return
+        else: 
+            emit_signal(kwargs, 'messagebox_set', [idx, 'Downloading...']) 
+            emit_signal(kwargs, 'progress_init', [idx, 100]) 
             emit_signal(kwargs, 'resize_window')  
 
-            emit_signal(kwargs, 'checkbox_set', [idx, False])   
+            # prefix with the video id, videos with the same title may download at the same time
+            file = file.download(output_path=download_path, filename_prefix=f'{vid.video_id}_')   
+        
+            emit_signal(kwargs, 'progress_set', [idx, 50])  
+            emit_signal(kwargs, 'resize_window')  
 
-    def add_tags(self, metadata=None):          
-    
-        root = Path(self.download_path)        
-        temp_audio_path = root.joinpath('temp.mp3')                 
-       
-        # overwrite track title with a new value        
-        artist = metadata.get('artist')
-        title = metadata.get('title')           
-        track = metadata.get('track_num')
+            if not audio_streams and not video_streams:
+                raise YoutubeException('No audio or video streams found.', idx=idx)
 
-        if self.playlist_title is not None:
-            album = self.playlist_title 
-        else:
-            album = "-"
-        
-        ffmpeg_proc = f'{ffmpeg} -i "{self.filename}"'
-        ffmpeg_proc += f' -metadata artist="{artist}"'
-        ffmpeg_proc += f' -metadata title="{title}"' 
-        ffmpeg_proc += f' -metadata track="{track}"'
-        ffmpeg_proc += f' -metadata album="{album}"'
-        ffmpeg_proc += f' "{temp_audio_path}"' 
-
-        subprocess.run(ffmpeg_proc, shell=True)                            
-    
-        try:
-            os.rename(temp_audio_path, self.filename)  
-        except OSError:
-            raise YoutubeException('Could not remove temp file.') 
+            # written next to filename, renamed once complete
+            with StagedFile(filename) as staged:
+                if audio_streams:
+                    if ext == '.mp3':
+                        ffmpeg_proc = [self.ffmpeg, '-i', file, '-vn', staged.path]
+                    else:
+                        # keep the source codec, the stream is only copied into the new container
+                        ffmpeg_proc = [self.ffmpeg, '-i', file, '-vn', '-c:a', 'copy', staged.path]
+                    try:
+                        FfmpegProcess(ffmpeg_proc, duration=vid.length).run()
+                    except FfmpegError as e:
+                        raise YoutubeException(f'Could not convert "{title}": {e}', idx=idx)
+                else:
+                    # moviepy pulls in numpy and imageio, only needed for this fallback
+                    from moviepy.editor import VideoFileClip
+                    video = VideoFileClip(file)
+                    audio = video.audio
+                    audio.write_audiofile(staged.path)
+                    audio.close()
+                    video.close()
 
-    def embed_art(self, thumbnail_url):
-        
-        root = Path(self.download_path)
-        temp_cover_path = root.joinpath('cover.png')
-        temp_audio_path = root.joinpath('temp.mp3')
-        try:
-            r = requests.get(thumbnail_url)  
-            r.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            raise YoutubeException(e)
-        except requests.exceptions.ConnectionError as e:
-            raise YoutubeException(e)   
-        except requests.exceptions.Timeout as e:
-            raise YoutubeException(e) 
-        except requests.exceptions.TooManyRedirects:
-            raise YoutubeException(e) 
-        except requests.exceptions.RequestException as e:
-            raise YoutubeException(e)
+            emit_signal(kwargs, 'progress_set', [idx, 75])  
+            emit_signal(kwargs, 'resize_window')  
+            try:
+                os.remove(file) 
+            except OSError:
+                raise YoutubeException('Could not remove temp file.', idx=idx)                        
+                        
+        emit_signal(kwargs, 'progress_set', [idx, 85]) 
+        emit_signal(kwargs, 'resize_window')  
+
+        artwork = self.get_artwork(vid.thumbnail_url)
+
+        emit_signal(kwargs, 'messagebox_set', [idx, 'Setting tags...']) 
+        emit_signal(kwargs, 'progress_set', [idx, 95]) 
+        emit_signal(kwargs, 'resize_window')  
+                
+        self.tag_file(filename, album, metadata, artwork, idx=idx)   
+
+        history.record('youtube', vid.video_id, filename)
+        deduplicate_download(self.cfg, filename)
         
-        with open(temp_cover_path, 'wb') as f:
-            f.write(r.content)
-
-        ffmpeg_proc = f'{ffmpeg} -i "{self.filename}" -i "{temp_cover_path}" -c copy -map 0 -map 1 "{temp_audio_path}"'        
-        subprocess.run(ffmpeg_proc, shell=True)
+        emit_signal(kwargs, 'messagebox_set', [idx, f'Downloaded.\\Downloaded "{title}".'])  
+        emit_signal(kwargs, 'progress_set', [idx, 100])            
+        emit_signal(kwargs, 'resize_window')  
+
+        emit_signal(kwargs, 'checkbox_set', [idx, False])   
+
+    def output_extension(self, stream):
+        """
+        Output container of a stream: the source codec is kept (.opus / .ogg / .m4a)
+        unless MP3 is requested in the config or ffmpeg has no container to copy it into.
+        """
+        if self.cfg.vargs.get('youtubeMp3') or stream.includes_video_track:
+            return '.mp3'
+        codec = (stream.audio_codec or '').split('.')[0]
+        ext, muxer = REMUX_EXTENSIONS.get(codec, ('.mp3', None))
+        if muxer is not None and not get_toolchain().can_mux(muxer):
+            # this ffmpeg build can not write the container, encode instead
+            return '.mp3'
+        return ext
+
+    def get_artwork(self, thumbnail_url):
+
+        artwork = get_artwork_cache(self.cfg.config_dir).get(
+            thumbnail_url, 
+            max_size=self.cfg.vargs.get('artworkMaxSize')
+        )
+        if artwork is None:
+            console_output(f'Could not get the thumbnail at "{thumbnail_url}".')
+        return artwork
+
+    def tag_file(self, filename, album=None, metadata=None, artwork=None, idx=None):          
+        """
+        Tag the file and embed the cover in place, no further ffmpeg pass over the audio.
+        """
+        if album is None:
+            album = "-"
 
+        # overwrite track title with a new value        
+        tags = TrackTags(
+            artist=metadata.get('artist'),
+            title=metadata.get('title'),
+            tracknumber=metadata.get('track_num'),
+            album=album,
+            artwork=artwork
+        )
         try:
-            os.rename(temp_audio_path, self.filename)
-        except OSError:
-            raise YoutubeException('Could not rename temp audio file.')
-        try:
-            os.remove(temp_cover_path)
-        except OSError:
-            raise YoutubeException('Could not delete temp conver image file.')
-                
\ No newline at end of file
+            write_tags(str(filename), tags)
+        except TaggingException as e:
+            raise YoutubeException(f'Could not set the tags: {e}', idx=idx)
@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+from os.path import join
+from pytube import YouTube, extract
+from pytube.cipher import Cipher
+from tomfoolery.utils import get_session
+
+logger = logging.getLogger(__name__)
+
+# player versions kept on disk
+PLAYER_MAX_VERSIONS = 4
+
+PLAYER_VERSION_REGEX = re.compile(r'/s/player/([\w-]+)/')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def player_key(js_url):
+    """
+    Cache key of a player: its version, plus a digest of the URL for the
+    locale / variant of the same version.
+
+    """
+    match = PLAYER_VERSION_REGEX.search(js_url)
+    version = match.group(1) if match else 'player'
+    digest = hashlib.sha1(js_url.encode('utf-8')).hexdigest()[:8]
+    return f'{version}-{digest}'
+
+
+class PlayerCache:
+    """
+    YouTube player JS and the cipher built from it, in memory and on disk, keyed by
+    player version.
+
+    Every video of a playlist shares the same player, hence only the first one
+    fetches and parses base.js, the following ones copy the cipher template.
+
+    """
+    def __init__(self, cache_dir=None, max_versions=PLAYER_MAX_VERSIONS):
+
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.max_versions = max_versions
+
+        self.lock = threading.Lock()
+        # key -> js
+        self.players = {}
+        # js -> key, the same js object is handed out for a key
+        self.keys = {}
+        # js -> cipher template
+        self.ciphers = {}
+
+    def js(self, js_url, refresh=False):
+        """
+        Returns:
+            str: player JS at js_url, fetched only if neither in memory nor on disk
+        """
+        key = player_key(js_url)
+        with self.lock:
+            if refresh:
+                self.forget(key)
+            elif key in self.players:
+                return self.players[key]
+
+            js = None if refresh else self.load_disk(f'{key}.js', text=True)
+            if js is None:
+                r = get_session().get(js_url)
+                r.raise_for_status()
+                js = r.text
+                self.store_disk(f'{key}.js', js.encode('utf-8'))
+            self.players[key] = js
+            self.keys[js] = key
+            return js
+
+    def cipher(self, js):
+        """
+        Cipher for js: built once per player, every call gets its own copy.
+
+        """
+        with self.lock:
+            template = self.ciphers.get(js)
+            key = self.keys.get(js)
+            if template is None and key is not None:
+                template = self.load_disk(f'{key}.cipher.pkl')
+            if template is None:
+                template = Cipher(js=js)
+                if key is not None:
+                    self.store_disk(f'{key}.cipher.pkl', pickle.dumps(template, protocol=pickle.HIGHEST_PROTOCOL))
+            self.ciphers[js] = template
+
+        return copy_cipher(template)
+
+    def forget(self, key):
+
+        js = self.players.pop(key, None)
+        if js is not None:
+            self.keys.pop(js, None)
+            self.ciphers.pop(js, None)
+        for filename in [f'{key}.js', f'{key}.cipher.pkl']:
+            if self.cache_dir is not None:
+                try:
+                    os.remove(join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
+    def load_disk(self, filename, text=False):
+
+        if self.cache_dir is None:
+            return None
+        path = join(self.cache_dir, filename)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data.decode('utf-8') if text else pickle.loads(data)
+        except (OSError, UnicodeDecodeError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug(f'Could not load "{path}": {e}')
+            return None
+
+    def store_disk(self, filename, data):
+
+        if self.cache_dir is None:
+            return
+        path = join(self.cache_dir, filename)
+        try:
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f'Could not store "{path}": {e}')
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Keep the files of the max_versions most recently used players.
+
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.js')]
+        except OSError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_versions:]:
+            key = entry.name[:-len('.js')]
+            for filename in [f'{key}.js', f'{key}.cipher.pkl']:
+                try:
+                    os.remove(join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
+
+def copy_cipher(template):
+    """
+    Fresh cipher from a template: `calculate_n` writes into the throttling array
+    and remembers its result, everything else is read-only.
+
+    """
+    cipher = copy.copy(template)
+    array = list(template.throttling_array)
+    # the parser replaces 'null' entries with the array itself
+    for i, item in enumerate(array):
+        if item is template.throttling_array:
+            array[i] = array
+    cipher.throttling_array = array
+    cipher.calculated_n = None
+    return cipher
+
+
+class CachedYouTube(YouTube):
+    """
+    YouTube object which takes the player JS from the player cache instead of
+    the single process-wide slot of pytube.
+
+    """
+    @property
+    def js(self):
+
+        if self._js:
+            return self._js
+        # pytube clears _js when the signature could not be applied, fetch the player again
+        refresh = getattr(self, '_js_loaded', False)
+        self._js = get_player_cache().js(self.js_url, refresh=refresh)
+        self._js_loaded = True
+        return self._js
+
+
+def get_player_cache(config_dir=None):
+    """
+    Return the player cache shared by all the YouTube objects (created on the first call,
+    in memory only if no config_dir is given).
+
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = PlayerCache(join(config_dir, 'youtube_player') if config_dir else None)
+            # every apply_signature() of pytube gets a copy of the cached cipher
+            extract.Cipher = _cache.cipher
+    return _cache
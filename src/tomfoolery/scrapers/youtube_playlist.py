@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+import json
+import threading
+from pytube import Playlist
+from pytube.helpers import uniqueify
+from .youtube_player import CachedYouTube
+
+
+def renderer_text(renderer, key):
+
+    value = renderer.get(key) or {}
+    if 'simpleText' in value:
+        return value['simpleText']
+    return ''.join(run.get('text', '') for run in value.get('runs', []))
+
+
+class PlaylistVideo:
+    """
+    Playlist entry listed from the playlist pages.
+
+    Id, title, author, duration and thumbnail come with the listing, the `CachedYouTube`
+    object (and its watch page request) is only created when the streams are needed.
+
+    """
+    def __init__(self, renderer):
+
+        self.video_id = renderer['videoId']
+        self.watch_url = f'https://youtube.com/watch?v={self.video_id}'
+        self.title = renderer_text(renderer, 'title')
+        self.author = renderer_text(renderer, 'shortBylineText')
+        self.length = int(renderer.get('lengthSeconds') or 0)
+
+        thumbnails = renderer.get('thumbnail', {}).get('thumbnails')
+        if thumbnails:
+            # last item has max size
+            self.thumbnail_url = thumbnails[-1]['url'].split('?')[0]
+        else:
+            self.thumbnail_url = f'https://i.ytimg.com/vi/{self.video_id}/hqdefault.jpg'
+
+        self._youtube = None
+        self._lock = threading.Lock()
+
+    @property
+    def youtube(self):
+
+        with self._lock:
+            if self._youtube is None:
+                self._youtube = CachedYouTube(self.watch_url)
+            return self._youtube
+
+    @property
+    def streams(self):
+
+        return self.youtube.streams
+
+
+class PlaylistListing(Playlist):
+    """
+    Playlist which keeps the `playlistVideoRenderer` data of its pages, so that the
+    tracklist is filled without fetching a watch page per video.
+
+    """
+    def __init__(self, url, proxies=None):
+
+        super().__init__(url, proxies)
+        self.renderers = {}
+
+    def _extract_videos(self, raw_json):
+        """
+        Same as `Playlist._extract_videos`, the renderers of the page are remembered.
+
+        """
+        initial_data = json.loads(raw_json)
+        try:
+            # json extracted from the html
+            section_contents = initial_data["contents"][
+                "twoColumnBrowseResultsRenderer"][
+                "tabs"][0]["tabRenderer"]["content"][
+                "sectionListRenderer"]["contents"]
+            try:
+                # Playlist without submenus
+                important_content = section_contents[
+                    0]["itemSectionRenderer"][
+                    "contents"][0]["playlistVideoListRenderer"]
+            except (KeyError, IndexError, TypeError):
+                # Playlist with submenus
+                important_content = section_contents[
+                    1]["itemSectionRenderer"][
+                    "contents"][0]["playlistVideoListRenderer"]
+            videos = important_content["contents"]
+        except (KeyError, IndexError, TypeError):
+            try:
+                # json sent by the server in a continuation response
+                videos = initial_data['onResponseReceivedActions'][0][
+                    'appendContinuationItemsAction']['continuationItems']
+            except (KeyError, IndexError, TypeError):
+                return [], None
+
+        try:
+            continuation = videos[-1]['continuationItemRenderer'][
+                'continuationEndpoint'
+            ]['continuationCommand']['token']
+            videos = videos[:-1]
+        except (KeyError, IndexError):
+            # no continuation is available
+            continuation = None
+
+        watch_paths = []
+        for video in videos:
+            renderer = video.get('playlistVideoRenderer')
+            if renderer is None:
+                continue
+            watch_path = f"/watch?v={renderer['videoId']}"
+            self.renderers.setdefault(watch_path, renderer)
+            watch_paths.append(watch_path)
+
+        return uniqueify(watch_paths), continuation
+
+    def listing(self):
+        """
+        Returns:
+            list: `PlaylistVideo` per entry, in the playlist order
+        """
+        watch_paths = uniqueify([watch_path for page in self._paginate() for watch_path in page])
+        return [PlaylistVideo(self.renderers[watch_path]) for watch_path in watch_paths]
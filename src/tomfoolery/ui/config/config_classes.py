@@ -47,7 +47,11 @@ class TomfooleryConfig():
         self.config_dir = config_dir
         self.vargs = {
             'artistFolder': None,
-            'albumFolder': None,            
+            'albumFolder': None,
+            'maxWorkers': 4,
+            'artworkMaxSize': 500,
+            'youtubeMp3': False,
+            'linkDuplicates': False,
         }
 
         self.load_pkl()
@@ -62,7 +66,7 @@ class TomfooleryConfig():
             with open(f, 'rb') as handle:                
                 pkl = pickle.load(handle)
                 for key in self.vargs:
-                    self.vargs[key] = pkl.get(key)
+                    self.vargs[key] = pkl.get(key, self.vargs[key])
                 return
 
     def pickle_cfg(self):
@@ -8,7 +8,7 @@ class Ui_ConfigDialog(object):
         style_dir = os.path.join(resources, 'stylesheet.qss')  
         with open(style_dir, mode='r') as f:
             Dialog.setStyleSheet(f.read())   
-        Dialog.resize(298, 129)
+        Dialog.resize(298, 237)
         self.verticalLayout_2 = QtWidgets.QVBoxLayout(Dialog)
         self.verticalLayout_2.setObjectName("verticalLayout_2")
         self.verticalLayout = QtWidgets.QVBoxLayout()
@@ -19,6 +19,34 @@ class Ui_ConfigDialog(object):
         self.checkBoxAlbumFolder = QtWidgets.QCheckBox(parent=Dialog)
         self.checkBoxAlbumFolder.setObjectName("checkBoxArtistFolder")
         self.verticalLayout.addWidget(self.checkBoxAlbumFolder)        
+        self.checkBoxYoutubeMp3 = QtWidgets.QCheckBox(parent=Dialog)
+        self.checkBoxYoutubeMp3.setObjectName("checkBoxYoutubeMp3")
+        self.verticalLayout.addWidget(self.checkBoxYoutubeMp3)
+        self.checkBoxLinkDuplicates = QtWidgets.QCheckBox(parent=Dialog)
+        self.checkBoxLinkDuplicates.setObjectName("checkBoxLinkDuplicates")
+        self.verticalLayout.addWidget(self.checkBoxLinkDuplicates)
+        self.horizontalLayoutMaxWorkers = QtWidgets.QHBoxLayout()
+        self.horizontalLayoutMaxWorkers.setObjectName("horizontalLayoutMaxWorkers")
+        self.labelMaxWorkers = QtWidgets.QLabel(parent=Dialog)
+        self.labelMaxWorkers.setObjectName("labelMaxWorkers")
+        self.horizontalLayoutMaxWorkers.addWidget(self.labelMaxWorkers)
+        self.spinBoxMaxWorkers = QtWidgets.QSpinBox(parent=Dialog)
+        self.spinBoxMaxWorkers.setObjectName("spinBoxMaxWorkers")
+        self.spinBoxMaxWorkers.setRange(1, 16)
+        self.horizontalLayoutMaxWorkers.addWidget(self.spinBoxMaxWorkers)
+        self.verticalLayout.addLayout(self.horizontalLayoutMaxWorkers)
+        self.horizontalLayoutArtworkMaxSize = QtWidgets.QHBoxLayout()
+        self.horizontalLayoutArtworkMaxSize.setObjectName("horizontalLayoutArtworkMaxSize")
+        self.labelArtworkMaxSize = QtWidgets.QLabel(parent=Dialog)
+        self.labelArtworkMaxSize.setObjectName("labelArtworkMaxSize")
+        self.horizontalLayoutArtworkMaxSize.addWidget(self.labelArtworkMaxSize)
+        self.spinBoxArtworkMaxSize = QtWidgets.QSpinBox(parent=Dialog)
+        self.spinBoxArtworkMaxSize.setObjectName("spinBoxArtworkMaxSize")
+        self.spinBoxArtworkMaxSize.setRange(100, 3000)
+        self.spinBoxArtworkMaxSize.setSingleStep(100)
+        self.spinBoxArtworkMaxSize.setSuffix(" px")
+        self.horizontalLayoutArtworkMaxSize.addWidget(self.spinBoxArtworkMaxSize)
+        self.verticalLayout.addLayout(self.horizontalLayoutArtworkMaxSize)
         self.verticalLayout_2.addLayout(self.verticalLayout)
         self.buttonBox = QtWidgets.QDialogButtonBox(parent=Dialog)
         self.buttonBox.setOrientation(QtCore.Qt.Orientation.Horizontal)
@@ -35,4 +63,8 @@ class Ui_ConfigDialog(object):
         _translate = QtCore.QCoreApplication.translate
         Dialog.setWindowTitle(_translate("Dialog", "Config"))
         self.checkBoxArtistFolder.setText(_translate("Dialog", "Organize saved songs in folders by artists."))
-        self.checkBoxAlbumFolder.setText(_translate("Dialog", "Organize saved songs in folders by album."))   
+        self.checkBoxAlbumFolder.setText(_translate("Dialog", "Organize saved songs in folders by album."))
+        self.checkBoxYoutubeMp3.setText(_translate("Dialog", "Convert YouTube audio to MP3."))
+        self.checkBoxLinkDuplicates.setText(_translate("Dialog", "Link identical downloads to the existing copy."))
+        self.labelMaxWorkers.setText(_translate("Dialog", "Simultaneous track downloads."))
+        self.labelArtworkMaxSize.setText(_translate("Dialog", "Max. size of the embedded artwork."))   
@@ -118,8 +118,12 @@ class Ui_TomfooleryWindow(object):
         self.action_Config = QtGui.QAction(parent=TomfooleryWindow)
         self.action_Config.setObjectName("action_Config")
         self.action_Config.setMenuRole(QtGui.QAction.MenuRole.NoRole)           
+        self.action_Deduplicate = QtGui.QAction(parent=TomfooleryWindow)
+        self.action_Deduplicate.setObjectName("action_Deduplicate")
+        self.action_Deduplicate.setMenuRole(QtGui.QAction.MenuRole.NoRole)
         self.menu_File.addAction(self.action_Directories)
         self.menu_File.addAction(self.action_Config)
+        self.menu_File.addAction(self.action_Deduplicate)
         self.menubar.addAction(self.menu_File.menuAction())
 
         style_dir = os.path.join(resources, 'stylesheet.qss')    
@@ -141,4 +145,5 @@ class Ui_TomfooleryWindow(object):
         self.menu_File.setTitle(_translate("TomfooleryWindow", "&File"))
         self.action_Directories.setText(_translate("TomfooleryWindow", "&Directories"))
         self.action_Config.setText(_translate("TomfooleryWindow", "&Config"))
+        self.action_Deduplicate.setText(_translate("TomfooleryWindow", "De&duplicate library"))
             
\ No newline at end of file
@@ -1,8 +1,82 @@
 #! /usr/bin/env python
-from .multithreading import execWorker, initWorker, WorkerSlots, emit_signal
-from .scrape_common import console_output
-from .image_downloader import ImageDownloader, ThumbnailHandler
-from .unavailable_tracks import UnavailableTracksHandler
-from .filename_handler import FilenameHandler
-from .metadata import MetadataHandler
-from .ffmpeg_progress import FfmpegProcess, handle_progress_info
+"""
+Shared helpers of the UI and the scrapers.
+
+The names are imported from their module on first access: importing the package
+(e.g. from main.py) does not load mutagen, ffmpeg-python, requests... until a
+scraper actually uses them.
+
+"""
+import importlib
+
+# name: module
+LAZY_ATTRIBUTES = {
+    'execWorker': '.multithreading',
+    'initWorker': '.multithreading',
+    'WorkerSlots': '.multithreading',
+    'emit_signal': '.multithreading',
+    'EventBus': '.event_bus',
+    'Event': '.event_bus',
+    'QtSink': '.event_bus',
+    'ConsoleSink': '.event_bus',
+    'CallbackSink': '.event_bus',
+    'console_output': '.scrape_common',
+    'ImageDownloader': '.image_downloader',
+    'ThumbnailHandler': '.image_downloader',
+    'UnavailableTracksHandler': '.unavailable_tracks',
+    'FilenameHandler': '.filename_handler',
+    'MetadataHandler': '.metadata',
+    'Toolchain': '.toolchain',
+    'ToolchainException': '.toolchain',
+    'get_toolchain': '.toolchain',
+    'FfmpegProcess': '.ffmpeg_progress',
+    'FfmpegError': '.ffmpeg_progress',
+    'FfmpegTimeout': '.ffmpeg_progress',
+    'FfmpegCancelled': '.ffmpeg_progress',
+    'handle_progress_info': '.ffmpeg_progress',
+    'TrackExecutor': '.track_executor',
+    'get_session': '.http_session',
+    'HlsDownloader': '.hls',
+    'HlsException': '.hls',
+    'HlsUnsupported': '.hls',
+    'ClientIdCache': '.client_id_cache',
+    'ArtworkCache': '.artwork_cache',
+    'get_artwork_cache': '.artwork_cache',
+    'DownloadHistory': '.download_history',
+    'get_download_history': '.download_history',
+    'DedupeIndex': '.dedupe',
+    'get_dedupe_index': '.dedupe',
+    'deduplicate_download': '.dedupe',
+    'scan_libraries': '.dedupe',
+    'payload_hash': '.dedupe',
+    'StagedFile': '.staging',
+    'StagingException': '.staging',
+    'staging_path': '.staging',
+    'publish': '.staging',
+    'StreamWriter': '.stream_writer',
+    'download_resumable': '.resumable',
+    'ResumableException': '.resumable',
+    'Download': '.resumable',
+    'JobContext': '.job_context',
+    'TrackTags': '.tagging',
+    'write_tags': '.tagging',
+    'TaggingException': '.tagging',
+    'Prefetcher': '.prefetch',
+}
+
+__all__ = list(LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+
+    if name in LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(LAZY_ATTRIBUTES[name], __name__), name)
+        # later lookups skip __getattr__
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES))
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from os.path import join
+import requests
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt6.QtGui import QImage
+from .http_session import get_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTWORK_MAX_SIZE = 500
+ARTWORK_JPEG_QUALITY = 90
+# in-memory tier, number of images
+MEMORY_MAX_ITEMS = 32
+# on-disk tier, total size of the stored images
+DISK_MAX_BYTES = 100 * 1024 ** 2
+
+Artwork = namedtuple('Artwork', ['data', 'mime'])
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def image_mime(data):
+
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    return None
+
+
+def downscale(data, max_size):
+    """
+    Downscale the image so that it fits into max_size x max_size and re-encode it as JPEG.
+    Images which already fit are returned untouched.
+
+    Returns:
+        bytes: image data, None if the data is not an image
+    """
+    image = QImage()
+    if not image.loadFromData(data):
+        return None
+    if image.width() <= max_size and image.height() <= max_size and image_mime(data):
+        return data
+
+    image = image.scaled(
+        max_size, max_size,
+        Qt.AspectRatioMode.KeepAspectRatio,
+        Qt.TransformationMode.SmoothTransformation
+    )
+    array = QByteArray()
+    buffer = QBuffer(array)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, 'JPEG', ARTWORK_JPEG_QUALITY)
+    buffer.close()
+    return bytes(array)
+
+
+class ArtworkCache:
+    """
+    Artwork cache shared by the scrapers.
+
+    Images are keyed by URL (and max. size), downscaled / re-encoded once and then handed
+    out as the same bytes to every tagger. An in-memory LRU sits in front of a size-bounded
+    on-disk store, in which images are stored by their content hash.
+
+    """
+    def __init__(self, cache_dir, memory_max_items=MEMORY_MAX_ITEMS, disk_max_bytes=DISK_MAX_BYTES):
+
+        self.cache_dir = cache_dir
+        self.urls_dir = join(cache_dir, 'urls')
+        self.blobs_dir = join(cache_dir, 'blobs')
+        os.makedirs(self.urls_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        self.memory_max_items = memory_max_items
+        self.disk_max_bytes = disk_max_bytes
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        # one download per URL, concurrent tracks wait for it
+        self.inflight = {}
+
+    def get(self, url, fallback_urls=(), max_size=DEFAULT_ARTWORK_MAX_SIZE):
+        """
+        Return the artwork found at the first URL which serves an image.
+
+        Returns:
+            Artwork: (data, mime), None if no image could be fetched
+        """
+        for candidate in (url, *fallback_urls):
+            if not candidate:
+                continue
+            artwork = self.get_one(candidate, max_size)
+            if artwork is not None:
+                return artwork
+        return None
+
+    def get_one(self, url, max_size):
+
+        key = hashlib.sha1(f'{url}@{max_size}'.encode('utf-8')).hexdigest()
+
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            event = self.inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self.inflight[key] = threading.Event()
+
+        if not owner:
+            event.wait()
+            with self.lock:
+                if key in self.memory:
+                    return self.memory[key]
+            return self.load_disk(key)
+
+        try:
+            artwork = self.load_disk(key)
+            if artwork is None:
+                artwork = self.fetch(url, max_size)
+                if artwork is not None:
+                    self.store_disk(key, artwork)
+            if artwork is not None:
+                self.store_memory(key, artwork)
+            return artwork
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
+
+    def fetch(self, url, max_size):
+
+        try:
+            r = get_session().get(url)
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.debug(f'Could not get artwork at {url}: {e}')
+            return None
+
+        data = downscale(r.content, max_size)
+        if data is None:
+            return None
+        return Artwork(data, image_mime(data))
+
+    def store_memory(self, key, artwork):
+
+        with self.lock:
+            self.memory[key] = artwork
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_max_items:
+                self.memory.popitem(last=False)
+
+    def load_disk(self, key):
+
+        try:
+            with open(join(self.urls_dir, key), 'r') as f:
+                digest = f.read().strip()
+            blob_path = join(self.blobs_dir, digest)
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # mark as recently used for the eviction
+        try:
+            os.utime(blob_path)
+        except OSError:
+            pass
+        return Artwork(data, image_mime(data))
+
+    def store_disk(self, key, artwork):
+
+        digest = hashlib.sha256(artwork.data).hexdigest()
+        blob_path = join(self.blobs_dir, digest)
+        try:
+            if not os.path.exists(blob_path):
+                tmp_path = f'{blob_path}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(artwork.data)
+                os.replace(tmp_path, blob_path)
+            with open(join(self.urls_dir, key), 'w') as f:
+                f.write(digest)
+        except OSError as e:
+            logger.debug(f'Could not store artwork: {e}')
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used images until the store fits into disk_max_bytes.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.blobs_dir) if entry.is_file()]
+        except OSError:
+            return
+        stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def get_artwork_cache(config_dir):
+    """
+    Return the artwork cache shared by all the scrapers (created on the first call).
+
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtworkCache(join(config_dir, 'artwork_cache'))
+    return _cache
@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+import os
+import pickle
+import threading
+import time
+from os.path import exists, join
+
+# a cached client_id older than this is not trusted anymore
+CLIENT_ID_TTL = 7 * 24 * 60 * 60
+
+
+class ClientIdCache:
+    """
+    Last known-good SoundCloud client_id, persisted in the config dir.
+
+    """
+    def __init__(self, config_dir, ttl=CLIENT_ID_TTL):
+
+        self.filename = 'soundcloud_client_id.pkl'
+        self.config_dir = config_dir
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+
+        return join(self.config_dir, self.filename)
+
+    def load(self):
+        """
+        Returns:
+            str: cached client_id, None if missing or expired
+        """
+        if not exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as handle:
+                pkl = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if time.time() - pkl.get('validated_at', 0) > self.ttl:
+            return None
+        return pkl.get('client_id')
+
+    def store(self, client_id):
+
+        with self.lock:
+            os.makedirs(self.config_dir, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as handle:
+                pickle.dump(
+                    {'client_id': client_id, 'validated_at': time.time()},
+                    handle,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp_path, self.path)
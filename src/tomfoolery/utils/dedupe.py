@@ -0,0 +1,439 @@
+#! /usr/bin/env python
+import errno
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import threading
+from collections import namedtuple
+from os.path import join
+from .scrape_common import console_output
+from .staging import staging_path, remove_quietly
+from .download_history import HASH_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {'.mp3', '.flac', '.m4a', '.mp4', '.aac', '.ogg', '.opus', '.wav', '.aiff', '.aif'}
+
+# ioctl(FICLONE) of Linux: the destination shares the blocks of the source, copy on write
+FICLONE = 0x40049409
+
+ScanResult = namedtuple('ScanResult', ['files', 'linked', 'reclaimed', 'retagged'])
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def id3v2_size(header):
+
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    # footer flag
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def mp3_ranges(f, file_size):
+    """
+    The MPEG frames: everything but the leading ID3v2 and the trailing ID3v1 / APEv2 tags.
+
+    """
+    start = id3v2_size(f.read(10))
+    end = file_size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b'TAG':
+            end -= 128
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            size, flags = struct.unpack('<I4xI', footer[12:24])
+            # the tag size counts the footer, not the optional header
+            end -= size + (32 if flags & 0x80000000 else 0)
+    return [(start, max(0, end - start))]
+
+
+def flac_ranges(f, file_size):
+    """
+    The audio frames, after the last metadata block (Vorbis comments, pictures, padding).
+
+    """
+    f.seek(4)
+    offset = 4
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            return None
+        offset += 4 + int.from_bytes(header[1:4], 'big')
+        if header[0] & 0x80:
+            break
+        f.seek(offset)
+    return [(offset, file_size - offset)]
+
+
+def mp4_ranges(f, file_size):
+    """
+    The payload of the `mdat` boxes, the tags live in `moov`.
+
+    """
+    ranges = []
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        size, kind = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header:
+            return None
+        if kind == b'mdat':
+            ranges.append((offset + header, size - header))
+        offset += size
+    return ranges or None
+
+
+# header packets in front of the audio, per codec: identification, comments (and setup)
+OGG_HEADER_PACKETS = {b'OpusHead': 2, b'\x01vorbis': 3}
+
+
+def ogg_ranges(f, file_size):
+    """
+    The bodies of the audio pages, after the header packets of the stream.
+
+    The comment packet (with the cover) spans as many pages as it needs, hence the
+    headers are skipped by counting the packets completed by the lacing values. The
+    number of header pages shifts the sequence numbers / CRCs of the pages after
+    them, hence only the page bodies are hashed.
+
+    """
+    ranges = []
+    offset = 0
+    serial = None
+    header_packets = None
+    packets = 0
+    while offset + 27 <= file_size:
+        f.seek(offset)
+        header = f.read(27)
+        if header[:4] != b'OggS':
+            return None
+        segments = f.read(header[26])
+        body_offset = offset + 27 + len(segments)
+        body = sum(segments)
+
+        if serial is None:
+            serial = header[14:18]
+            first_packet = f.read(8)
+            header_packets = next(
+                (count for magic, count in OGG_HEADER_PACKETS.items() if first_packet.startswith(magic)),
+                None
+            )
+            if header_packets is None:
+                # unknown codec, hashed whole
+                return None
+
+        skip = 0
+        if header[14:18] == serial and packets < header_packets:
+            # bytes of this page still belonging to the header packets
+            for lacing in segments:
+                if packets >= header_packets:
+                    break
+                skip += lacing
+                if lacing < 255:
+                    packets += 1
+        if body > skip:
+            ranges.append((body_offset + skip, body - skip))
+        offset = body_offset + body
+    return ranges or None
+
+
+def riff_ranges(f, file_size):
+    """
+    The `data` chunk of WAV / AIFF files, the tags are in other chunks.
+
+    """
+    f.seek(0)
+    magic = f.read(12)
+    little = magic[:4] == b'RIFF'
+    offset = 12
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        kind, size = struct.unpack('<4sI' if little else '>4sI', f.read(8))
+        if kind in (b'data', b'SSND'):
+            return [(offset + 8, min(size, file_size - offset - 8))]
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def audio_ranges(f, file_size):
+    """
+    Byte ranges of the audio payload of an open file, found from its magic bytes.
+
+    Returns:
+        list: (offset, length) pairs, None if the format is unknown
+    """
+    f.seek(0)
+    magic = f.read(12)
+    f.seek(0)
+    if magic[:4] == b'fLaC':
+        return flac_ranges(f, file_size)
+    if magic[:4] == b'OggS':
+        return ogg_ranges(f, file_size)
+    if magic[4:8] == b'ftyp':
+        return mp4_ranges(f, file_size)
+    if magic[:4] == b'RIFF' and magic[8:12] == b'WAVE' or magic[:4] == b'FORM' and magic[8:12] in (b'AIFF', b'AIFC'):
+        return riff_ranges(f, file_size)
+    if magic[:3] == b'ID3' or magic[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2', b'\xff\xfa'):
+        return mp3_ranges(f, file_size)
+    return None
+
+
+def payload_hash(path):
+    """
+    SHA-256 of the audio payload of path, its tags and artwork excluded.
+    Files of an unknown format are hashed whole.
+
+    """
+    digest = hashlib.sha256()
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        try:
+            ranges = audio_ranges(f, file_size)
+        except (struct.error, OSError) as e:
+            logger.debug(f'Could not parse "{path}": {e}')
+            ranges = None
+        for offset, length in ranges or [(0, file_size)]:
+            f.seek(offset)
+            while length > 0 and (chunk := f.read(min(HASH_CHUNK_SIZE, length))):
+                digest.update(chunk)
+                length -= len(chunk)
+    return digest.hexdigest()
+
+
+def same_content(path_a, path_b):
+
+    if os.path.getsize(path_a) != os.path.getsize(path_b):
+        return False
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        while True:
+            chunk_a, chunk_b = a.read(HASH_CHUNK_SIZE), b.read(HASH_CHUNK_SIZE)
+            if chunk_a != chunk_b:
+                return False
+            if not chunk_a:
+                return True
+
+
+def link_file(source, destination):
+    """
+    Replace destination with a reflink of source (a copy sharing its blocks), or
+    else with a hard link, atomically.
+
+    Returns:
+        str: 'reflink' or 'hardlink'
+    """
+    staged = staging_path(destination)
+    try:
+        try:
+            import fcntl
+            with open(source, 'rb') as src, open(staged, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            method = 'reflink'
+        except (ImportError, OSError):
+            remove_quietly(staged)
+            os.link(source, staged)
+            method = 'hardlink'
+        # same directory, the rename is atomic
+        os.replace(staged, destination)
+    except OSError:
+        remove_quietly(staged)
+        raise
+    return method
+
+
+class DedupeIndex:
+    """
+    Downloaded files keyed by the hash of their audio payload.
+
+    The same release fetched twice (another source, another folder layout) has the
+    same payload whatever its tags, and is found with a single indexed query. A
+    byte-identical duplicate is replaced with a reflink / hard link to the first copy;
+    a duplicate which only differs in its tags is reported and kept, linking it would
+    retag the other copy.
+
+    """
+    def __init__(self, db_path):
+
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        # files are added from the track executor threads
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, '
+                'payload_hash TEXT NOT NULL, '
+                'size INTEGER NOT NULL, '
+                'mtime REAL NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS files_payload ON files (payload_hash)')
+
+    def hash_of(self, path, stat):
+        """
+        Payload hash of path, only computed again if the file changed since it was indexed.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT payload_hash FROM files WHERE path = ? AND size = ? AND mtime = ?',
+                (path, stat.st_size, stat.st_mtime)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        digest = payload_hash(path)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files (path, payload_hash, size, mtime) VALUES (?, ?, ?, ?)',
+                (path, digest, stat.st_size, stat.st_mtime)
+            )
+        return digest
+
+    def candidates(self, digest, path):
+
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT path FROM files WHERE payload_hash = ? AND path != ? ORDER BY rowid',
+                (digest, path)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def forget(self, path):
+
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+
+    def add(self, path, link=True):
+        """
+        Index path, and link it to an identical file indexed before if link is set.
+
+        Returns:
+            tuple: (method, original) if path was linked, ('retagged', original) for the
+            same audio with other tags, (None, None) if path is unique
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        digest = self.hash_of(path, stat)
+
+        retagged = None
+        for original in self.candidates(digest, path):
+            try:
+                other = os.stat(original)
+            except OSError:
+                # moved or deleted since it was indexed
+                self.forget(original)
+                continue
+            if (other.st_dev, other.st_ino) == (stat.st_dev, stat.st_ino):
+                return 'linked', original
+            if not same_content(original, path):
+                retagged = retagged or original
+                continue
+            if not link:
+                return 'duplicate', original
+            try:
+                method = link_file(original, path)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP):
+                    logger.debug(f'Could not link "{path}" to "{original}": {e}')
+                continue
+            # the link has the mtime of the original
+            self.hash_of(path, os.stat(path))
+            logger.info(f'"{path}" is a duplicate of "{original}", replaced with a {method}.')
+            return method, original
+
+        if retagged is not None:
+            logger.info(f'"{path}" has the same audio as "{retagged}" with other tags, kept as is.')
+            return 'retagged', retagged
+        return None, None
+
+    def scan(self, roots, link=True, **kwargs):
+        """
+        Index every audio file under roots, linking the identical ones.
+
+        Returns:
+            ScanResult: files seen, files linked, bytes reclaimed and duplicates
+            with other tags
+        """
+        files = linked = reclaimed = retagged = 0
+        for root in roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                # skip the hidden staging files
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for filename in filenames:
+                    if filename.startswith('.') or os.path.splitext(filename)[1].lower() not in AUDIO_EXTENSIONS:
+                        continue
+                    path = join(dirpath, filename)
+                    files += 1
+                    try:
+                        size = os.path.getsize(path)
+                        method, _ = self.add(path, link=link)
+                    except OSError as e:
+                        logger.debug(f'Could not index "{path}": {e}')
+                        continue
+                    if method in ('reflink', 'hardlink'):
+                        linked += 1
+                        reclaimed += size
+                    elif method == 'retagged':
+                        retagged += 1
+
+        return ScanResult(files, linked, reclaimed, retagged)
+
+
+def get_dedupe_index(config_dir):
+    """
+    Return the dedupe index shared by all the scrapers (created on the first call).
+
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = DedupeIndex(join(config_dir, 'dedupe_index.sqlite3'))
+    return _index
+
+
+def deduplicate_download(cfg, filename):
+    """
+    Index a finished download, replacing it with a link if it duplicates another one.
+
+    """
+    if cfg is None or filename is None or not cfg.vargs.get('linkDuplicates'):
+        return
+    try:
+        get_dedupe_index(cfg.config_dir).add(filename)
+    except (OSError, sqlite3.Error) as e:
+        logger.debug(f'Could not deduplicate "{filename}": {e}')
+
+
+def scan_libraries(config_dir, roots, **kwargs):
+    """
+    Bulk deduplication of the download directories, run on a worker.
+
+    """
+    roots = [root for root in roots if root and os.path.isdir(root)]
+    console_output(f'Deduplicating "{len(roots)}" download directories...')
+    result = get_dedupe_index(config_dir).scan(roots)
+    console_output(
+        f'Scanned "{result.files}" files: "{result.linked}" duplicates linked, '
+        f'"{result.reclaimed / 1024 ** 2:.1f}" MB reclaimed, '
+        f'"{result.retagged}" duplicates with other tags kept.'
+    )
+    return result
@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from os.path import join
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 ** 2
+
+HistoryEntry = namedtuple('HistoryEntry', ['source', 'track_id', 'path', 'size', 'sha256', 'downloaded_at'])
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def file_sha256(path):
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadHistory:
+    """
+    Tracks downloaded so far, keyed by the source and the source track id
+    (SoundCloud track id, Bandcamp track id, YouTube video id).
+
+    The lookup is a single primary key query plus one stat of the recorded file, a
+    retagged file is still known as downloaded and nothing on disk has to be listed.
+
+    """
+    def __init__(self, db_path):
+
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        # the scrapers record tracks from the track executor threads
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                'source TEXT NOT NULL, '
+                'track_id TEXT NOT NULL, '
+                'path TEXT NOT NULL, '
+                'size INTEGER, '
+                'sha256 TEXT, '
+                'downloaded_at REAL NOT NULL, '
+                'PRIMARY KEY (source, track_id))'
+            )
+
+    def lookup(self, source, track_id):
+        """
+        Returns:
+            HistoryEntry: the recorded download, None if the track was never downloaded
+        """
+        if track_id is None:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT source, track_id, path, size, sha256, downloaded_at '
+                'FROM history WHERE source = ? AND track_id = ?',
+                (source, str(track_id))
+            ).fetchone()
+        return HistoryEntry(*row) if row is not None else None
+
+    def contains(self, source, track_id):
+        """
+        Returns:
+            bool: True if the track was downloaded and its file is still there; the entry
+            of a deleted file is forgotten, so that the track is downloaded again
+        """
+        entry = self.lookup(source, track_id)
+        if entry is None:
+            return False
+        if not os.path.exists(entry.path):
+            self.forget(source, track_id)
+            return False
+        return True
+
+    def record(self, source, track_id, path, sha256=None):
+        """
+        Remember a downloaded track, its size and hash are taken from the file at path.
+
+        """
+        if track_id is None or path is None:
+            return
+        path = os.path.abspath(path)
+        try:
+            size = os.path.getsize(path)
+            if sha256 is None:
+                sha256 = file_sha256(path)
+        except OSError as e:
+            logger.debug(f'Not recording "{path}" in the download history: {e}')
+            return
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO history (source, track_id, path, size, sha256, downloaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (source, str(track_id), path, size, sha256, time.time())
+            )
+
+    def forget(self, source, track_id):
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM history WHERE source = ? AND track_id = ?',
+                (source, str(track_id))
+            )
+
+
+def get_download_history(config_dir):
+    """
+    Return the download history shared by all the scrapers (created on the first call).
+
+    """
+    global _history
+
+    with _history_lock:
+        if _history is None:
+            _history = DownloadHistory(join(config_dir, 'download_history.sqlite3'))
+    return _history
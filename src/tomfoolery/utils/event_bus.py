@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+import logging
+import threading
+import time
+from collections import namedtuple
+from .scrape_common import console_output
+
+logger = logging.getLogger(__name__)
+
+# deliveries per second to the sinks
+EVENT_RATE = 20
+
+# events of which only the latest value per track matters
+COALESCED_EVENTS = {'progress_set', 'checkbox_set'}
+# events without a track, delivered once per flush after the track events
+WINDOW_EVENTS = {'resize_window'}
+
+Event = namedtuple('Event', ['name', 'idx', 'args'])
+
+
+class QtSink:
+    """
+    Deliver the events through the Qt signals of a worker.
+
+    """
+    def __init__(self, signals):
+
+        self.signals = signals
+
+    def __call__(self, event):
+
+        if (sig := getattr(self.signals, event.name, None)) is not None:
+            sig.emit(*event.args)
+
+
+class ConsoleSink:
+    """
+    Print the status messages, for runs without the GUI.
+
+    """
+    def __call__(self, event):
+
+        if event.name == 'messagebox_set':
+            console_output(f'Track n°"{event.idx + 1}": {event.args[1]}')
+
+
+class CallbackSink:
+
+    def __init__(self, fn):
+
+        self.fn = fn
+
+    def __call__(self, event):
+
+        self.fn(event)
+
+
+class EventBus:
+    """
+    Progress / status events published by the scrapers, coalesced per track.
+
+    The worker threads only queue the events, a flusher thread hands them to the
+    sinks at most `rate` times per second: a progress bar receives its latest value
+    instead of one signal per chunk, and the window is resized once per flush.
+
+    """
+    def __init__(self, sinks=None, rate=EVENT_RATE):
+
+        self.sinks = list(sinks or [])
+        self.interval = 1 / rate
+
+        self.lock = threading.Lock()
+        # key -> Event, insertion ordered
+        self.pending = {}
+        self.window_events = set()
+        self.counter = 0
+
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.flusher = None
+
+    def add_sink(self, sink):
+
+        self.sinks.append(sink)
+
+    def publish(self, name, args=()):
+
+        args = list(args)
+        idx = args[0] if args and name not in WINDOW_EVENTS else None
+
+        with self.lock:
+            if name in WINDOW_EVENTS:
+                self.window_events.add(name)
+            elif name in COALESCED_EVENTS:
+                # a queued event keeps its position, only its value is updated
+                self.pending[(name, idx)] = Event(name, idx, args)
+            else:
+                if name == 'progress_init':
+                    # the bar is reset, a queued value of the previous range is stale
+                    self.pending.pop(('progress_set', idx), None)
+                self.counter += 1
+                self.pending[(name, idx, self.counter)] = Event(name, idx, args)
+
+            if self.flusher is None and not self.closed:
+                self.flusher = threading.Thread(target=self.run, name='event-bus', daemon=True)
+                self.flusher.start()
+        self.wakeup.set()
+
+    def run(self):
+
+        while not self.closed:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.closed:
+                break
+            self.flush()
+            # bounds the delivery rate, the events of this interval are coalesced
+            time.sleep(self.interval)
+
+    def flush(self):
+
+        with self.lock:
+            events = list(self.pending.values())
+            events += [Event(name, None, []) for name in sorted(self.window_events)]
+            self.pending = {}
+            self.window_events = set()
+
+        for event in events:
+            for sink in self.sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    logger.debug(f'Event sink failed on {event.name}: {e}')
+
+    def close(self):
+        """
+        Stop the flusher and deliver the remaining events, from the calling thread.
+
+        """
+        with self.lock:
+            self.closed = True
+            flusher = self.flusher
+        self.wakeup.set()
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+        self.flush()
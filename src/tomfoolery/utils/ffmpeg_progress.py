@@ -1,125 +1,433 @@
 import os
-from pathlib import Path
+import selectors
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
 from ffmpeg import probe
-from tqdm import tqdm
 import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 from .multithreading import emit_signal
+from .toolchain import get_toolchain
 
+# stderr lines kept per process, shown in the error message
+STDERR_MAX_LINES = 200
+# how often timeouts / cancellations are checked, in seconds
+POLL_INTERVAL = 0.2
+READ_SIZE = 64 * 1024
 
-def handle_progress_info(percentage, **kwargs):   
+_supervisor = None
+_supervisor_lock = threading.Lock()
 
-    if percentage is not None:        
-        emit_signal(kwargs, 'progress_set', [kwargs.get('idx'), round(percentage)]) 
+
+class FfmpegError(Exception):
+    """
+    ffmpeg failed, the message holds the tail of its stderr.
+
+    """
+    def __init__(self, message, returncode=None, stderr=''):
+
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class FfmpegTimeout(FfmpegError):
+    pass
+
+
+class FfmpegCancelled(FfmpegError):
+    pass
+
+
+def handle_progress_info(percentage, **kwargs):
+
+    if percentage is not None:
+        emit_signal(kwargs, 'progress_set', [kwargs.get('idx'), round(percentage)])
+
+
+class ProgressParser:
+    """
+    Incremental parser of the `-progress` output: key=value lines, every block ends
+    with a `progress=continue|end` line.
+
+    """
+    def __init__(self, duration=None, handler=None, handler_kwargs=None):
+
+        self.duration = duration
+        self.handler = handler
+        self.handler_kwargs = handler_kwargs or {}
+        self.partial = b''
+        self.block = {}
+        self.last = {}
+
+    def feed(self, data):
+
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            key, sep, value = line.decode('utf-8', 'replace').strip().partition('=')
+            if not sep:
+                continue
+            self.block[key] = value
+            if key == 'progress':
+                self.last, self.block = self.block, {}
+                self.report()
+
+    def seconds_processed(self):
+
+        # out_time_ms holds microseconds as well
+        for key in ('out_time_us', 'out_time_ms'):
+            value = self.last.get(key)
+            if value and value != 'N/A':
+                try:
+                    return int(value) / 1_000_000
+                except ValueError:
+                    pass
+        return None
+
+    def report(self):
+
+        if self.handler is None or not self.duration:
+            return
+        seconds_processed = self.seconds_processed()
+        if seconds_processed is None:
+            return
+        percentage = min(100.0, max(0.0, seconds_processed / self.duration * 100))
+        self.handler(percentage, **self.handler_kwargs)
+
+
+class FfmpegJob:
+    """
+    A running ffmpeg process: progress and stderr are consumed by the supervisor,
+    the owner waits for it, cancels it or lets it time out.
+
+    """
+    def __init__(self, args, parser, timeout=None):
+
+        self.args = args
+        self.parser = parser
+        self.stderr = deque(maxlen=STDERR_MAX_LINES)
+        self.stderr_partial = b''
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+        self.cancelled = False
+        self.timed_out = False
+        self.error = None
+        self.done = threading.Event()
+        self.open_streams = 2
+
+        self.process = subprocess.Popen(
+            args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def feed(self, stream, data):
+
+        if stream == 'stdout':
+            if self.error is not None:
+                # failed job, its output is drained until the process exits
+                return
+            try:
+                self.parser.feed(data)
+            except Exception as e:
+                logger.warning(f'FFmpeg progress handler failed: {e}')
+                self.fail(FfmpegError(f'The FFmpeg progress handler failed: {e}'))
+        else:
+            lines = (self.stderr_partial + data).split(b'\n')
+            self.stderr_partial = lines.pop()
+            self.stderr.extend(line.decode('utf-8', 'replace').rstrip() for line in lines)
+
+    def stream_closed(self, stream):
+
+        self.open_streams -= 1
+        if stream == 'stderr' and self.stderr_partial:
+            self.stderr.append(self.stderr_partial.decode('utf-8', 'replace').rstrip())
+            self.stderr_partial = b''
+
+    def check(self):
+        """
+        Kill the process once cancelled or past its deadline.
+
+        """
+        if self.process.poll() is not None:
+            return
+        if not self.cancelled and self.deadline is not None and time.monotonic() > self.deadline:
+            self.timed_out = True
+        if self.cancelled or self.timed_out:
+            self.process.kill()
+
+    def fail(self, error):
+        """
+        Fail this job only: the process is killed, the error is raised by wait().
+
+        """
+        if self.error is None:
+            self.error = error
+        if self.process.poll() is None:
+            self.process.kill()
+
+    def finished(self):
+
+        return self.open_streams == 0 and self.process.poll() is not None
+
+    def finish(self):
+
+        try:
+            returncode = self.process.wait()
+            self.process.stdout.close()
+            self.process.stderr.close()
+            tail = self.stderr_text(20)
+            if self.error is not None:
+                # already failed by fail(), e.g. a raising progress handler
+                pass
+            elif self.cancelled:
+                self.error = FfmpegCancelled('The FFmpeg process was cancelled.', returncode, tail)
+            elif self.timed_out:
+                self.error = FfmpegTimeout('The FFmpeg process timed out.', returncode, tail)
+            elif returncode != 0:
+                self.error = FfmpegError(
+                    f'The FFmpeg process encountered an error ({returncode}):\n{tail}', returncode, tail
+                )
+        finally:
+            # the owner never waits forever, whatever failed above
+            self.done.set()
+
+    def stderr_text(self, lines=None):
+
+        log = list(self.stderr)
+        return '\n'.join(log[-lines:] if lines else log)
+
+    def cancel(self):
+
+        self.cancelled = True
+        self.check()
+
+    def wait(self):
+        """
+        Raises:
+            FfmpegError: ffmpeg failed, was cancelled or timed out
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class FfmpegSupervisor(threading.Thread):
+    """
+    Single thread reading the pipes of every running ffmpeg process with a selector.
+
+    """
+    def __init__(self):
+
+        super().__init__(name='ffmpeg-supervisor', daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.jobs = set()
+        # wakes the selector up when a job is added
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_w, False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+
+    def add(self, job):
+
+        with self.lock:
+            self.pending.append(job)
+        try:
+            os.write(self.wakeup_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def run(self):
+
+        while True:
+            for key, _ in self.selector.select(timeout=POLL_INTERVAL):
+                if key.data is None:
+                    os.read(self.wakeup_r, READ_SIZE)
+                    continue
+                job, stream = key.data
+                try:
+                    try:
+                        data = os.read(key.fd, READ_SIZE)
+                    except OSError:
+                        data = b''
+                    if data:
+                        job.feed(stream, data)
+                    else:
+                        self.selector.unregister(key.fileobj)
+                        job.stream_closed(stream)
+                except Exception as e:
+                    self.drop(job, e)
+
+            with self.lock:
+                pending, self.pending = self.pending, []
+            for job in pending:
+                self.jobs.add(job)
+                try:
+                    self.selector.register(job.process.stdout, selectors.EVENT_READ, (job, 'stdout'))
+                    self.selector.register(job.process.stderr, selectors.EVENT_READ, (job, 'stderr'))
+                except Exception as e:
+                    self.drop(job, e)
+
+            for job in list(self.jobs):
+                try:
+                    job.check()
+                    if job.finished():
+                        self.jobs.discard(job)
+                        job.finish()
+                except Exception as e:
+                    self.drop(job, e)
+
+    def drop(self, job, error):
+        """
+        Stop supervising a job which raised, the other jobs keep running.
+
+        """
+        logger.warning(f'FFmpeg job failed in the supervisor: {error}')
+        self.jobs.discard(job)
+        for pipe in (job.process.stdout, job.process.stderr):
+            try:
+                self.selector.unregister(pipe)
+            except (KeyError, ValueError):
+                pass
+        try:
+            job.fail(FfmpegError(f'The FFmpeg process could not be supervised: {error}'))
+        except OSError:
+            pass
+        job.finish()
+
+
+def supervise_with_threads(job):
+    """
+    Fallback for Windows, where pipes can not be selected: a reader thread per pipe.
+
+    """
+    def read(stream):
+        pipe = getattr(job.process, stream)
+        while (data := pipe.read1(READ_SIZE) if hasattr(pipe, 'read1') else pipe.read(READ_SIZE)):
+            job.feed(stream, data)
+        job.stream_closed(stream)
+
+    def watch():
+        readers = [
+            threading.Thread(target=read, args=(stream,), daemon=True)
+            for stream in ('stdout', 'stderr')
+        ]
+        try:
+            for reader in readers:
+                reader.start()
+            while True:
+                try:
+                    job.process.wait(timeout=POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    job.check()
+            for reader in readers:
+                reader.join()
+        except Exception as e:
+            job.fail(FfmpegError(f'The FFmpeg process could not be supervised: {e}'))
+        finally:
+            job.finish()
+
+    threading.Thread(target=watch, name='ffmpeg-watch', daemon=True).start()
+
+
+def supervise(job):
+
+    global _supervisor
+
+    if sys.platform == 'win32':
+        supervise_with_threads(job)
+        return
+
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = FfmpegSupervisor()
+            _supervisor.start()
+    _supervisor.add(job)
 
 
 class FfmpegProcess:
-    def __init__(self, command, ffmpeg_loglevel="verbose"):
+    def __init__(self, command, ffmpeg_loglevel="verbose", duration=None):
         """
         Creates the list of FFmpeg arguments.
         Accepts an optional ffmpeg_loglevel parameter to set the value of FFmpeg's -loglevel argument.
-        """    
+        Accepts an optional duration (in seconds) of the input, the input is only probed without it.
+        """
+
+        toolchain = get_toolchain()
+        if command[0] == "ffmpeg":
+            # the binary located by the toolchain
+            command = [toolchain.ffmpeg] + command[1:]
 
         index_of_filepath = command.index("-i") + 1
         self._filepath = str(command[index_of_filepath])
         self._output_filepath = str(command[-1])
 
-        dirname = os.path.dirname(self._output_filepath)
-
-        if dirname != "":
-            self._dir_files = [file for file in os.listdir(dirname)]
-        else:
-            self._dir_files = [file for file in os.listdir()]
-
-        self._can_get_duration = True
-
+        self._duration_secs = None
         try:
-            self._duration_secs = float(probe(self._filepath)["format"]["duration"])          
+            if duration:
+                # known by the caller (track metadata, HLS playlist), no probing
+                self._duration_secs = float(duration)
+            elif toolchain.ffprobe:
+                self._duration_secs = float(probe(self._filepath, cmd=toolchain.ffprobe)["format"]["duration"])
         except Exception:
-            self._can_get_duration = False
+            self._duration_secs = None
+
+        # existing output is overwritten, pipe:1 sends the progress to stdout
+        self._ffmpeg_args = (
+            command[:1] + ["-y"] + command[1:]
+            + ["-hide_banner", "-loglevel", ffmpeg_loglevel, "-progress", "pipe:1", "-nostats"]
+        )
 
-        self._ffmpeg_args = command + ["-hide_banner", "-loglevel", ffmpeg_loglevel]
+        self.job = None
 
-        if self._can_get_duration:
-            # pipe:1 sends the progress to stdout. See https://stackoverflow.com/a/54386052/13231825
-            self._ffmpeg_args += ["-progress", "pipe:1", "-nostats"]
+    def start(self, progress_handler=None, timeout=None, **kwargs):
+        """
+        Start ffmpeg without waiting for it.
+
+        Returns:
+            FfmpegJob: wait() / cancel() handle of the process
+        """
+        parser = ProgressParser(self._duration_secs, progress_handler, kwargs)
+        try:
+            self.job = FfmpegJob(self._ffmpeg_args, parser, timeout=timeout)
+        except OSError as e:
+            raise FfmpegError(f'Could not start FFmpeg: {e}')
+        supervise(self.job)
+        return self.job
 
-    def run(self, progress_handler=None, ffmpeg_output_file=None, success_handler=None, error_handler=None, **kwargs):
-        if ffmpeg_output_file is None:
-            os.makedirs("ffmpeg_output", exist_ok=True)
-            ffmpeg_output_file = os.path.join("ffmpeg_output", f"[{Path(self._filepath).name}].txt")
+    def cancel(self):
 
-        if "-y" not in self._ffmpeg_args and self._output_filepath in self._dir_files:
-            choice = input(f"{self._output_filepath} already exists. Overwrite? [Y/N]: ").lower()
-            if choice != "y":
-                print("File will not be overwritten. Exiting Better FFmpeg Process.")
-                sys.exit()
+        if self.job is not None:
+            self.job.cancel()
 
-        self._ffmpeg_args.insert(1, "-y")
+    def run(self, progress_handler=None, ffmpeg_output_file=None, success_handler=None,
+            error_handler=None, timeout=None, **kwargs):
+        """
+        Run ffmpeg and wait for it.
 
-        with open(ffmpeg_output_file, "a") as f:
-            process = subprocess.Popen(
-                self._ffmpeg_args, stdout=subprocess.PIPE, stderr=f
-            )
-         
-        if self._can_get_duration:
-            progress_bar = tqdm(total=round(self._duration_secs, 1), unit="s", dynamic_ncols=True, leave=False)
-            progress_bar.clear()
-            previous_seconds_processed = 0
+        Args:
+            progress_handler (callable, optional): called with the percentage done and kwargs
+            ffmpeg_output_file (str, optional): log file the captured stderr is written to
+            timeout (float, optional): seconds after which the process is killed
 
+        Raises:
+            FfmpegError: ffmpeg failed, FfmpegTimeout / FfmpegCancelled
+        """
+        job = self.start(progress_handler=progress_handler, timeout=timeout, **kwargs)
         try:
-            while process.poll() is None:
-                if self._can_get_duration:
-                    ffmpeg_output = process.stdout.readline().decode()
-                    # A progress handler was not specified. Use tqdm to show a progress bar.
-                    if progress_handler is None:
-                        if "out_time_ms" in ffmpeg_output:
-                            seconds_processed = round(int(ffmpeg_output.strip()[12:]) / 1_000_000, 1)
-                            seconds_increase = seconds_processed - previous_seconds_processed
-                            progress_bar.update(seconds_increase)
-                            previous_seconds_processed = seconds_processed
-                    # A progress handler was specified.
-                    else:
-                        percentage_progress = None
-                        speed = None
-                        total_size = None  
-                        eta = None
-                        estimated_size = None
-
-                        if "total_size" in ffmpeg_output:
-                            # e.g. FFmpeg total_size=1310720 
-                            if 'N/A' not in ffmpeg_output.split("=")[1]:
-                                total_size = int(ffmpeg_output.split("=")[1])
-                            
-                        elif "out_time_ms" in ffmpeg_output:
-                            seconds_processed = int(ffmpeg_output.strip()[12:]) / 1_000_000
-                            if self._can_get_duration:
-                                percentage_progress = (seconds_processed / self._duration_secs) * 100
-                                estimated_size = total_size * (100 / percentage_progress) if total_size else None
-
-                        elif "speed" in ffmpeg_output:
-                            speed = ffmpeg_output.split("=")[1].strip()[:-1]
-                            if speed != "0" and "N/A" not in speed:
-                                speed = float(speed)
-                                if self._can_get_duration:
-                                    eta = (self._duration_secs - seconds_processed) / speed
-
-                        progress_handler(percentage_progress, **kwargs)
-
-            if process.returncode != 0:
-                raise Exception(f"The FFmpeg process encountered an error. Check {ffmpeg_output_file}.")
-            
-            if process.returncode == 0:
-                progress_bar.close()    
-                if success_handler:
-                    success_handler()
-    
-        except Exception as e:
-            progress_bar.close()
-            process.kill()
-            print(f"[Error] {e}\nExiting FFmpeg Progress.")
-            sys.exit()
-            
\ No newline at end of file
+            job.wait()
+        except FfmpegError as e:
+            if error_handler:
+                error_handler(e)
+            raise
+        finally:
+            if ffmpeg_output_file:
+                with open(ffmpeg_output_file, "a") as f:
+                    f.write(job.stderr_text() + "\n")
+
+        if success_handler:
+            success_handler()
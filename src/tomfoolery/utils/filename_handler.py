@@ -1,7 +1,7 @@
 #! /usr/bin/env python
 import re
 from os.path import join, exists
-from os import mkdir
+from os import makedirs
 from pathlib import Path
 from pathvalidate import sanitize_filename
 from .scrape_common import console_output
@@ -76,8 +76,8 @@ class FilenameHandler:
         directory = self.metadata['artist']
         directory = sanitize_filename(directory)
         self.dir = join(self.dir, directory)
-        if not exists(self.dir):
-            mkdir(self.dir)      
+        # tracks of the same artist may be downloaded concurrently
+        makedirs(self.dir, exist_ok=True)
 
     def makeAlbumFolder(self):
 
@@ -87,8 +87,7 @@ class FilenameHandler:
             directory = self.metadata['artist'] + " - " + self.metadata['title']
         directory = sanitize_filename(directory)
         self.dir = join(self.dir, directory)
-        if not exists(self.dir):
-            mkdir(self.dir)   
+        makedirs(self.dir, exist_ok=True)
 
     def getOutput(self):
 
@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+import os
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .http_session import get_session
+
+# segments fetched at the same time for a single stream
+HLS_MAX_WORKERS = 8
+HLS_SEGMENT_RETRIES = 3
+HLS_RETRY_BACKOFF = 0.5
+
+# first byte of every MPEG-TS packet
+TS_SYNC_BYTE = 0x47
+
+ATTRIBUTE_REGEX = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class HlsException(Exception):
+    pass
+
+
+class HlsUnsupported(HlsException):
+    """
+    The playlist uses a feature the native engine does not handle (encryption, byte ranges).
+    The caller should fall back to ffmpeg.
+
+    """
+    pass
+
+
+def parse_attributes(line):
+
+    attributes = {}
+    for key, value in ATTRIBUTE_REGEX.findall(line.split(':', 1)[1]):
+        attributes[key] = value.strip('"')
+    return attributes
+
+
+class HlsPlaylist:
+    """
+    Media playlist parsed from an m3u8 file.
+
+    """
+    def __init__(self, text, url):
+
+        self.url = url
+        self.segments = []
+        self.init_segment = None
+        self.variants = []
+
+        duration = None
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line.startswith('#EXT-X-MAP:'):
+                self.init_segment = self.absolute(parse_attributes(line)['URI'])
+            elif line.startswith('#EXT-X-KEY:'):
+                if parse_attributes(line).get('METHOD', 'NONE') != 'NONE':
+                    raise HlsUnsupported('Encrypted HLS stream.')
+            elif line.startswith('#EXT-X-BYTERANGE'):
+                raise HlsUnsupported('HLS byte range segments.')
+            elif line.startswith('#EXT-X-STREAM-INF'):
+                # master playlist, the next URI is a variant
+                duration = -1
+            elif line.startswith('#'):
+                continue
+            elif duration == -1:
+                self.variants.append(self.absolute(line))
+                duration = None
+            else:
+                self.segments.append((self.absolute(line), duration or 0.0))
+                duration = None
+
+    def absolute(self, uri):
+
+        return urllib.parse.urljoin(self.url, uri)
+
+    @property
+    def duration(self):
+        """
+        Total duration in seconds, sum of the EXTINF entries.
+
+        """
+        return sum(duration for _, duration in self.segments)
+
+
+class HlsDownloader:
+    """
+    Download an HLS stream in-process.
+
+    The segments are fetched in parallel on the pooled session, each one with its own retries,
+    and written in order into a single file. When the segments can not simply be concatenated
+    into the requested container (MPEG-TS, fragmented MP4), `needs_remux` is set and the caller
+    remuxes the concatenated file with ffmpeg.
+
+    """
+    def __init__(self, url, headers=None, max_workers=HLS_MAX_WORKERS, session=None):
+
+        self.session = session or get_session()
+        self.headers = headers
+        self.max_workers = max_workers
+
+        self.playlist = self.fetch_playlist(url)
+        if not self.playlist.segments:
+            raise HlsException('HLS playlist has no segments.')
+
+        self.needs_remux = self.playlist.init_segment is not None
+
+    def fetch_playlist(self, url):
+
+        r = self.session.get(url, headers=self.headers)
+        r.raise_for_status()
+        playlist = HlsPlaylist(r.text, r.url)
+        if playlist.variants and not playlist.segments:
+            r = self.session.get(playlist.variants[0], headers=self.headers)
+            r.raise_for_status()
+            playlist = HlsPlaylist(r.text, r.url)
+        return playlist
+
+    @property
+    def duration(self):
+
+        return self.playlist.duration
+
+    def fetch_segment(self, url):
+
+        for attempt in range(HLS_SEGMENT_RETRIES + 1):
+            try:
+                r = self.session.get(url, headers=self.headers)
+                r.raise_for_status()
+                return r.content
+            except requests.exceptions.RequestException as e:
+                if attempt == HLS_SEGMENT_RETRIES:
+                    raise HlsException(f'Could not download HLS segment: {e}')
+                time.sleep(HLS_RETRY_BACKOFF * (2 ** attempt))
+
+    def download(self, filename, progress_handler=None):
+        """
+        Write the whole stream to filename.
+
+        Args:
+            filename (str): output path
+            progress_handler (callable, optional): called with the percentage done
+
+        Returns:
+            str: filename
+        """
+        urls = [url for url, _ in self.playlist.segments]
+        total = len(urls)
+        # bounded look-ahead, finished segments wait in memory until it is their turn
+        window = self.max_workers * 2
+
+        futures = {}
+        try:
+            with open(filename, 'wb') as f, ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hls') as pool:
+                try:
+                    if self.playlist.init_segment:
+                        f.write(self.fetch_segment(self.playlist.init_segment))
+
+                    submitted = 0
+                    for written in range(total):
+                        while submitted < total and submitted - written < window:
+                            futures[submitted] = pool.submit(self.fetch_segment, urls[submitted])
+                            submitted += 1
+
+                        data = futures.pop(written).result()
+                        if written == 0 and data[:1] == bytes([TS_SYNC_BYTE]):
+                            self.needs_remux = True
+                        f.write(data)
+
+                        if progress_handler is not None:
+                            progress_handler((written + 1) / total * 100)
+                except BaseException:
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+        except BaseException:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            raise
+
+        return filename
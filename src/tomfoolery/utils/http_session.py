@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (10, 60)
+
+# number of hosts a pool is kept for
+POOL_CONNECTIONS = 16
+# keep-alive connections per host
+POOL_MAXSIZE = 16
+# hosts serving media are hit by several tracks / segments at the same time
+HOST_POOL_MAXSIZE = {
+    'https://cf-hls-media.sndcdn.com': 64,
+    'https://cf-hls-opus-media.sndcdn.com': 64,
+    'https://cf-media.sndcdn.com': 32,
+    'https://i1.sndcdn.com': 32,
+    'https://t4.bcbits.com': 32,
+    'https://f4.bcbits.com': 32,
+}
+
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TimeoutSession(requests.Session):
+    """
+    Session applying a default timeout to every request.
+
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_adapter(pool_maxsize=POOL_MAXSIZE):
+
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_TOTAL,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_FORCELIST,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        # hand the last response to the caller instead of raising
+        raise_on_status=False,
+    )
+    return HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+
+
+def make_session():
+    """
+    Create a session with keep-alive pools, default timeouts and retries with backoff.
+
+    """
+    session = TimeoutSession()
+    session.mount('http://', make_adapter())
+    session.mount('https://', make_adapter())
+    for host, pool_maxsize in HOST_POOL_MAXSIZE.items():
+        session.mount(host, make_adapter(pool_maxsize))
+    return session
+
+
+def get_session():
+    """
+    Return the session shared by all the scrapers (created on the first call).
+
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+    return _session
@@ -0,0 +1,33 @@
+#! /usr/bin/env python
+import os
+import threading
+
+
+class JobContext:
+    """
+    State of a single scraping job.
+
+    Holds the absolute download path and the files written by the job, so that neither
+    the working directory nor module globals are touched and several jobs (and the
+    tracks of a job) can run at the same time.
+
+    """
+    def __init__(self, download_path):
+
+        self.download_path = os.path.abspath(download_path)
+        self.files_to_keep = set()
+        self.lock = threading.Lock()
+
+    def path(self, *parts):
+
+        return os.path.join(self.download_path, *parts)
+
+    def keep(self, filename):
+
+        with self.lock:
+            self.files_to_keep.add(os.path.abspath(filename))
+
+    def is_kept(self, filename):
+
+        with self.lock:
+            return os.path.abspath(filename) in self.files_to_keep
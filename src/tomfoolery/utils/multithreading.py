@@ -2,14 +2,21 @@
 from PyQt6 import QtCore
 from PyQt6.QtCore import QRunnable, QObject, pyqtSlot, pyqtSignal
 from .scrape_common import console_output
+from .event_bus import EventBus, QtSink
 import textwrap
+import logging
+logger = logging.getLogger(__name__)
 
 def emit_signal(kwargs, signal, args=[]):
   
-    if sig:=kwargs.get(signal):
+    if (bus := kwargs.get('event_bus')) is not None:
+        # coalesced and delivered by the event bus
+        bus.publish(signal, args)
+    elif sig:=kwargs.get(signal):
         sig.emit(*args)  
     else:
-        raise ValueError(f'Missing signal in the kwargs: {signal}.')
+        # no GUI attached, the scrapers run all the same
+        logger.debug(f'Missing signal in the kwargs: {signal}.')
 
 class WorkerSlots:
 
@@ -99,12 +106,15 @@ class execWorker(QRunnable):
         self.kwargs['resize_window'] = self.signals.resize_window
         self.kwargs['checkbox_set'] = self.signals.checkbox_set
         self.kwargs['messagebox_set'] = self.signals.messagebox_set   
+        # the per-track events reach the signals above through the bus, at a bounded rate
+        self.kwargs['event_bus'] = EventBus([QtSink(self.signals)])
         
     @pyqtSlot()
     def run(self):
         '''
         Initialise the runner function with passed args, kwargs.
         '''        
+        bus = self.kwargs['event_bus']
         try:
             ret = self.fn(*self.args, **self.kwargs) 
         except Exception as e:
@@ -114,8 +124,11 @@ class execWorker(QRunnable):
                 emit_signal(self.kwargs, 'resize_window')
             except AttributeError:
                 pass
+            # the queued events are delivered before the error
+            bus.close()
             self.signals.worker_error.emit(e)
             return
+        bus.close()
         self.signals.worker_finished.emit()
 
 class initWorker(QRunnable):
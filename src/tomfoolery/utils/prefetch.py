@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# tracks resolved ahead of the one being downloaded, without the executor's max_workers
+PREFETCH_DEPTH = 2
+
+
+class Prefetcher:
+    """
+    Lookahead stage in front of the track executor.
+
+    When a track is requested, the next `depth` tracks are resolved in the background
+    (stream URLs, manifests), so the following downloads start without waiting on
+    metadata round trips. Prefetching is best effort: a failed prefetch returns None
+    and the caller resolves the track itself, reporting the error as usual.
+
+    A track not prefetched yet is resolved in the calling thread, hence the pool only
+    adds lookahead and never bounds the concurrency of the track executor. `depth` is
+    meant to be the executor's max_workers, the tracks the next free workers pick up.
+
+    """
+    def __init__(self, fn, keys, depth=None):
+
+        self.fn = fn
+        self.keys = list(keys)
+        self.positions = {key: n for n, key in enumerate(self.keys)}
+        self.depth = depth or PREFETCH_DEPTH
+
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, self.depth), thread_name_prefix='prefetch')
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def get(self, key):
+        """
+        Returns:
+            result of fn(key), None if it failed
+        """
+        pos = self.positions.get(key)
+        if pos is None:
+            return None
+
+        with self.lock:
+            future = self.futures.get(key)
+            inline = future is None
+            if inline:
+                # not in flight, resolved right here rather than queued behind the lookahead
+                future = self.futures[key] = Future()
+            for next_key in self.keys[pos + 1:pos + 1 + self.depth]:
+                if next_key not in self.futures:
+                    self.futures[next_key] = self.pool.submit(self.fn, next_key)
+
+        if inline:
+            try:
+                future.set_result(self.fn(key))
+            except Exception as e:
+                future.set_exception(e)
+
+        try:
+            return future.result()
+        except Exception as e:
+            logger.debug(f'Prefetch of {key} failed: {e}')
+            return None
+
+    def close(self):
+
+        self.pool.shutdown(wait=False, cancel_futures=True)
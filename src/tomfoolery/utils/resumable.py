@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+import json
+import logging
+import os
+import re
+import time
+from collections import namedtuple
+import requests
+import urllib3
+from .http_session import get_session
+from .stream_writer import StreamWriter
+from .staging import publish
+
+logger = logging.getLogger(__name__)
+
+# the connection is resumed this many times within a single download
+RESUME_RETRIES = 3
+RESUME_BACKOFF = 1.0
+
+CONTENT_RANGE_REGEX = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+Download = namedtuple('Download', ['filename', 'size'])
+
+
+class ResumableException(Exception):
+    pass
+
+
+def part_paths(filename):
+    """
+    Returns:
+        tuple: (partial file, sidecar holding its ETag and size)
+    """
+    return filename + '.part', filename + '.part.json'
+
+
+def load_sidecar(path):
+    """
+    The sidecar is plain JSON, never unpickled: the download directory may be shared.
+
+    """
+    try:
+        with open(path, encoding='utf-8') as handle:
+            sidecar = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    return sidecar if isinstance(sidecar, dict) else {}
+
+
+def store_sidecar(path, sidecar):
+
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(sidecar, handle)
+
+
+def remove_quietly(*paths):
+
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def total_size(r, offset):
+    """
+    Full size of the resource, None if the server does not tell.
+
+    """
+    if r.status_code == 206:
+        match = CONTENT_RANGE_REGEX.match(r.headers.get('content-range', ''))
+        if match and match.group(3) != '*':
+            return int(match.group(3))
+        return None
+    length = r.headers.get('content-length')
+    return int(length) if length is not None else None
+
+
+def download_resumable(url, filename, session=None, params=None, headers=None,
+                       progress_init=None, progress_handler=None):
+    """
+    Download url to filename, keeping the partial file if the transfer breaks.
+
+    The partial file sits next to filename with a sidecar recording the ETag and the
+    full size. A later call (or one of the retries below) continues it with a `Range`
+    request, `If-Range` makes the server send the whole file again if it changed.
+    The file is only moved to filename once its size matches.
+
+    The body is written by a StreamWriter: large reads into a reused buffer, the file
+    preallocated from the content length and synced once. It is not hashed here, the
+    file is tagged afterwards: the download history hashes the final file.
+
+    Args:
+        url (str): file URL
+        filename (str): output path
+        progress_init (callable, optional): called with the full size in bytes
+        progress_handler (callable, optional): called with the bytes received so far
+
+    Returns:
+        Download: filename and size of the downloaded file
+    """
+    session = session or get_session()
+    part_path, sidecar_path = part_paths(filename)
+
+    for attempt in range(RESUME_RETRIES + 1):
+        try:
+            if fetch_part(session, url, part_path, sidecar_path, params, headers,
+                          progress_init, progress_handler):
+                break
+        except requests.exceptions.HTTPError as e:
+            raise ResumableException(f'Download failed: {e}')
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+                urllib3.exceptions.HTTPError) as e:
+            logger.debug(f'Download of "{filename}" interrupted: {e}')
+        if attempt == RESUME_RETRIES:
+            raise ResumableException('Connection closed prematurely, download incomplete.')
+        time.sleep(RESUME_BACKOFF * (2 ** attempt))
+
+    size = os.path.getsize(part_path)
+    publish(part_path, filename)
+    remove_quietly(sidecar_path)
+    return Download(filename, size)
+
+
+def fetch_part(session, url, part_path, sidecar_path, params, headers, progress_init, progress_handler):
+    """
+    Continue the partial file from where it stopped.
+
+    Returns:
+        bool: True if the partial file is complete
+    """
+    sidecar = load_sidecar(sidecar_path) if os.path.exists(part_path) else {}
+    if sidecar.get('writing'):
+        # the process died while writing, the preallocated tail was not truncated
+        sidecar = {}
+    offset = os.path.getsize(part_path) if sidecar else 0
+
+    headers = dict(headers or {})
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+        if sidecar.get('etag'):
+            headers['If-Range'] = sidecar['etag']
+
+    with session.get(url, params=params, headers=headers, stream=True) as r:
+
+        if r.status_code == 416:
+            # nothing left to fetch, or the file shrank: start over
+            if offset and offset == sidecar.get('size'):
+                return True
+            remove_quietly(part_path, sidecar_path)
+            return False
+        r.raise_for_status()
+
+        size = total_size(r, offset)
+        etag = r.headers.get('etag')
+        resumed = r.status_code == 206
+        if resumed and (size != sidecar.get('size') or etag != sidecar.get('etag')):
+            # resumed a different file than the partial one
+            remove_quietly(part_path, sidecar_path)
+            return False
+        if not resumed:
+            offset = 0
+        else:
+            logger.debug(f'Resuming "{part_path}" at {offset} bytes.')
+
+        store_sidecar(sidecar_path, {'etag': etag, 'size': size, 'writing': True})
+        if progress_init is not None:
+            progress_init(size or 0)
+
+        # content-encoding is decoded by urllib3, r.raw then yields the file bytes
+        r.raw.decode_content = True
+        try:
+            with StreamWriter(part_path, size=size, append=resumed) as writer:
+                received = writer.copy_from(r.raw, progress_handler)
+        finally:
+            # the writer truncated the file to the bytes received, it can be resumed
+            store_sidecar(sidecar_path, {'etag': etag, 'size': size})
+
+    return size is None or received == size
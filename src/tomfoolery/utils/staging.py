@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+import errno
+import itertools
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+_temp_counter = itertools.count()
+
+# (source device, destination device) pairs already reported as cross-device
+_cross_device = set()
+_cross_device_lock = threading.Lock()
+
+
+class StagingException(Exception):
+    pass
+
+
+def staging_path(destination, suffix=None):
+    """
+    Hidden temporary path next to destination, unique across threads and processes.
+    It keeps the extension of destination unless a suffix is given, ffmpeg picks the
+    output format from it. The file is not created.
+
+    """
+    dirname, basename = os.path.split(os.path.abspath(destination))
+    stem, ext = os.path.splitext(basename)
+    if suffix is None:
+        suffix = ext
+    return os.path.join(dirname, f'.{stem}.{os.getpid()}-{next(_temp_counter)}{suffix}')
+
+
+def device_of(path):
+
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def publish(source, destination):
+    """
+    Move a finished file to its destination with an atomic rename.
+
+    A staged file is on the filesystem of its destination, hence the rename never
+    copies. If source is on another device after all, the file is copied once and
+    the device pair is reported the first time it is seen.
+
+    """
+    try:
+        os.replace(source, destination)
+        return destination
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise StagingException(f'Could not move "{source}" to "{destination}": {e}')
+
+    devices = (device_of(source), device_of(os.path.dirname(os.path.abspath(destination))))
+    with _cross_device_lock:
+        first = devices not in _cross_device
+        _cross_device.add(devices)
+    if first:
+        logger.warning(
+            f'"{os.path.dirname(source)}" and "{os.path.dirname(destination)}" are on different '
+            f'filesystems, the files are copied.'
+        )
+
+    # copy next to destination first, the destination itself is still replaced atomically
+    staged = staging_path(destination)
+    try:
+        shutil.copyfile(source, staged)
+        os.replace(staged, destination)
+        os.remove(source)
+    except OSError as e:
+        remove_quietly(staged)
+        raise StagingException(f'Could not move "{source}" to "{destination}": {e}')
+    return destination
+
+
+def remove_quietly(path):
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class StagedFile:
+    """
+    Write a file under a temporary name next to its destination, published once the
+    block completes; on an exception the temporary file is removed.
+
+        with StagedFile(filename) as staged:
+            run_ffmpeg(staged.path)
+
+    """
+    def __init__(self, destination, suffix=None):
+
+        self.destination = os.path.abspath(destination)
+        self.path = staging_path(self.destination, suffix)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        if exc_type is not None:
+            remove_quietly(self.path)
+            return
+        if not os.path.exists(self.path):
+            raise StagingException(f'Nothing was written to "{self.path}".')
+        publish(self.path, self.destination)
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# read size bounds, the chunk grows while the connection keeps the buffer full
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 ** 2
+# a full read faster than this doubles the chunk size
+FAST_READ_SECS = 0.05
+
+
+class StreamWriter:
+    """
+    Write a download to disk in large chunks.
+
+    The file is preallocated from the expected size (less fragmentation, an early
+    ENOSPC) and synced once when closed. Closing also truncates the preallocated
+    tail, so the file size is always the bytes written.
+
+    """
+    def __init__(self, path, size=None, append=False):
+
+        self.path = path
+        # not O_APPEND, the writes must land in the preallocated blocks
+        self.f = open(path, 'r+b' if append and os.path.exists(path) else 'wb')
+        self.offset = self.f.seek(0, os.SEEK_END)
+        self.written = self.offset
+
+        self.preallocated = False
+        if size and size > self.offset:
+            self.preallocated = preallocate(self.f, self.offset, size - self.offset)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        self.close(sync=exc_type is None)
+
+    def write(self, data):
+
+        self.f.write(data)
+        self.written += len(data)
+
+    def copy_from(self, raw, progress_handler=None):
+        """
+        Copy a readable binary stream (e.g. `response.raw`) into the file.
+
+        Returns:
+            int: bytes in the file
+        """
+        buffer = bytearray(MAX_CHUNK_SIZE)
+        view = memoryview(buffer)
+        chunk_size = MIN_CHUNK_SIZE
+        while True:
+            started = time.monotonic()
+            n = raw.readinto(view[:chunk_size])
+            if not n:
+                break
+            self.write(view[:n])
+            if progress_handler is not None:
+                progress_handler(self.written)
+            if n == chunk_size and chunk_size < MAX_CHUNK_SIZE and time.monotonic() - started < FAST_READ_SECS:
+                chunk_size *= 2
+        return self.written
+
+    def close(self, sync=True):
+
+        if self.f.closed:
+            return
+        try:
+            if self.preallocated:
+                self.f.truncate(self.written)
+            self.f.flush()
+            if sync:
+                os.fsync(self.f.fileno())
+        finally:
+            self.f.close()
+
+
+def preallocate(f, offset, length):
+    """
+    Reserve the blocks of the file, where the filesystem supports it.
+
+    Returns:
+        bool: True if the file was extended
+    """
+    if not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        f.flush()
+        os.posix_fallocate(f.fileno(), offset, length)
+        return True
+    except OSError as e:
+        logger.debug(f'Could not preallocate "{f.name}": {e}')
+        return False
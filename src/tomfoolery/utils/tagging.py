@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+import base64
+from dataclasses import dataclass
+import mutagen
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import (
+    ID3, APIC, COMM, TALB, TCON, TDRC, TIT2, TPE1, TRCK, WOAR, WXXX, PictureType
+)
+from mutagen.mp4 import MP4Cover, MP4Tags
+
+# free space reserved in the tag, later edits are written in place
+TAG_PADDING = 16 * 1024
+# larger padding left behind by an earlier tag is trimmed down to TAG_PADDING
+TAG_PADDING_MAX = 1024 ** 2
+
+
+class TaggingException(Exception):
+    pass
+
+
+@dataclass
+class TrackTags:
+    """
+    Complete tag set of a track, written to the file in a single save.
+
+    `artwork` is an `Artwork` (data, mime) from the artwork cache.
+
+    """
+    title: str = None
+    artist: str = None
+    album: str = None
+    tracknumber: str = None
+    date: str = None
+    genre: str = None
+    url: str = None
+    description: str = None
+    artwork: object = None
+
+
+def reserve_padding(info):
+    """
+    Padding callback for mutagen's save(): keep the padding in place while the tag still
+    fits into it, otherwise reserve TAG_PADDING for the next edit.
+
+    """
+    if 0 <= info.padding <= TAG_PADDING_MAX:
+        return info.padding
+    return TAG_PADDING
+
+
+def write_tags(filename, tags: TrackTags):
+    """
+    Replace the tags of an MP3, WAV, AIFF, FLAC, Ogg or MP4 file.
+
+    The whole tag set, art included, is built in memory and saved once.
+
+    Returns:
+        str: filename
+    """
+    try:
+        audio = mutagen.File(filename)
+    except mutagen.MutagenError as e:
+        raise TaggingException(f'Could not read "{filename}": {e}')
+    if audio is None:
+        raise TaggingException(f'Unsupported file type: "{filename}".')
+
+    if audio.tags is None:
+        audio.add_tags()
+    else:
+        audio.tags.clear()
+
+    if isinstance(audio.tags, ID3):
+        set_id3(audio.tags, tags)
+    elif isinstance(audio.tags, MP4Tags):
+        set_mp4(audio.tags, tags)
+    else:
+        set_vorbis(audio, tags)
+
+    try:
+        audio.save(padding=reserve_padding)
+    except mutagen.MutagenError as e:
+        raise TaggingException(f'Could not save the tags of "{filename}": {e}')
+    return filename
+
+
+def set_id3(id3, tags):
+
+    if tags.title:
+        id3.add(TIT2(encoding=3, text=tags.title))
+    if tags.artist:
+        id3.add(TPE1(encoding=3, text=tags.artist))
+    if tags.album:
+        id3.add(TALB(encoding=3, text=tags.album))
+    if tags.tracknumber:
+        id3.add(TRCK(encoding=3, text=str(tags.tracknumber)))
+    if tags.date:
+        id3.add(TDRC(encoding=3, text=str(tags.date)))
+    if tags.genre:
+        id3.add(TCON(encoding=3, text=tags.genre))
+    if tags.url:
+        id3.add(WOAR(url=tags.url))
+        # there is software that doesn't use WOAR, the url is saved again as WXXX
+        id3.add(WXXX(encoding=3, url=tags.url))
+    if tags.description:
+        id3.add(COMM(encoding=3, lang='ENG', text=tags.description))
+    if tags.artwork:
+        id3.add(
+            APIC(
+                encoding=3,  # 3 is for utf-8
+                mime=tags.artwork.mime,
+                type=PictureType.COVER_FRONT,
+                desc='Cover',
+                data=tags.artwork.data
+            )
+        )
+
+
+def set_mp4(mp4, tags):
+
+    if tags.title:
+        mp4['\xa9nam'] = tags.title
+    if tags.artist:
+        mp4['\xa9ART'] = tags.artist
+    if tags.album:
+        mp4['\xa9alb'] = tags.album
+    if tags.tracknumber and str(tags.tracknumber).isdigit():
+        mp4['trkn'] = [(int(tags.tracknumber), 0)]
+    if tags.date:
+        mp4['\xa9day'] = str(tags.date)
+    if tags.genre:
+        mp4['\xa9gen'] = tags.genre
+    if tags.url:
+        mp4['purl'] = tags.url
+    if tags.description:
+        mp4['\xa9cmt'] = tags.description
+    if tags.artwork:
+        if tags.artwork.mime == 'image/png':
+            imageformat = MP4Cover.FORMAT_PNG
+        else:
+            imageformat = MP4Cover.FORMAT_JPEG
+        mp4['covr'] = [MP4Cover(tags.artwork.data, imageformat=imageformat)]
+
+
+def set_vorbis(audio, tags):
+    """
+    Vorbis comments, used by FLAC and Ogg (Vorbis, Opus).
+
+    """
+    for key in ['title', 'artist', 'album', 'tracknumber', 'date', 'genre', 'description']:
+        if (value := getattr(tags, key)):
+            audio[key] = str(value)
+    if tags.url:
+        audio['website'] = tags.url
+
+    picture = None
+    if tags.artwork:
+        picture = Picture()
+        picture.data = tags.artwork.data
+        picture.mime = tags.artwork.mime
+        picture.type = PictureType.COVER_FRONT
+        picture.desc = 'Cover'
+
+    if isinstance(audio, FLAC):
+        audio.clear_pictures()
+        if picture is not None:
+            audio.add_picture(picture)
+    elif picture is not None:
+        audio['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
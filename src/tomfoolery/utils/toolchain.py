@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+import logging
+import os
+import pickle
+import shutil
+import subprocess
+import threading
+from os.path import join
+
+logger = logging.getLogger(__name__)
+
+_toolchain = None
+_toolchain_lock = threading.Lock()
+
+
+class ToolchainException(Exception):
+    pass
+
+
+def run_ffmpeg_info(binary, *args):
+    """
+    Returns:
+        str: stdout of the run, None if it failed or timed out
+    """
+    try:
+        result = subprocess.run(
+            [binary, '-hide_banner', *args],
+            capture_output=True,
+            text=True,
+            errors='replace',
+            timeout=30
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f'Could not run "{binary}": {e}')
+        return None
+    if result.returncode != 0 or not result.stdout:
+        logger.debug(f'"{binary} {" ".join(args)}" failed ({result.returncode}).')
+        return None
+    return result.stdout
+
+
+def parse_table(output, separator):
+    """
+    Parse the `-codecs` / `-muxers` listing of ffmpeg.
+
+    Returns:
+        dict: name -> capability flags
+    """
+    table = {}
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = line.strip().startswith(separator)
+            continue
+        parts = line.split(None, 2)
+        if len(parts) < 2:
+            continue
+        for name in parts[1].split(','):
+            table[name] = parts[0]
+    return table
+
+
+def probe_capabilities(ffmpeg):
+    """
+    Version, codecs and muxers of the ffmpeg binary, a few ffmpeg runs.
+
+    Returns:
+        tuple: (capabilities, True if every run succeeded)
+    """
+    outputs = [run_ffmpeg_info(ffmpeg, arg) for arg in ('-version', '-codecs', '-muxers')]
+    version, codec_list, muxer_list = (output or '' for output in outputs)
+    codecs = parse_table(codec_list, '-------')
+    muxers = parse_table(muxer_list, '--')
+    capabilities = {
+        'version': version.split('\n')[0],
+        'decoders': {name for name, flags in codecs.items() if flags[:1] == 'D'},
+        'encoders': {name for name, flags in codecs.items() if flags[1:2] == 'E'},
+        'muxers': {name for name, flags in muxers.items() if 'E' in flags},
+    }
+    return capabilities, None not in outputs and bool(codecs) and bool(muxers)
+
+
+class Toolchain:
+    """
+    ffmpeg / ffprobe located once per process.
+
+    Their version, codecs and muxers are cached in the config dir, keyed by the binary
+    path and mtime, so the probing runs only after ffmpeg was installed or updated.
+    A failed probe is not cached.
+
+    """
+    def __init__(self, cache_dir=None):
+
+        self.ffmpeg = shutil.which('ffmpeg')
+        if not self.ffmpeg:
+            raise ToolchainException('ffmpeg is not installed.')
+        # ffprobe is optional, durations are then taken from the ffmpeg progress only
+        self.ffprobe = shutil.which('ffprobe')
+
+        self.cache_path = join(cache_dir, 'toolchain.pkl') if cache_dir else None
+        self.capabilities = self.load_capabilities()
+
+    @property
+    def version(self):
+
+        return self.capabilities['version']
+
+    def can_decode(self, codec):
+
+        return codec in self.capabilities['decoders']
+
+    def can_encode(self, codec):
+
+        return codec in self.capabilities['encoders']
+
+    def can_mux(self, muxer):
+
+        return muxer in self.capabilities['muxers']
+
+    def binary_key(self):
+
+        stat = os.stat(self.ffmpeg)
+        return (os.path.realpath(self.ffmpeg), stat.st_mtime, stat.st_size)
+
+    def load_capabilities(self):
+
+        key = self.binary_key()
+        if self.cache_path is not None:
+            try:
+                with open(self.cache_path, 'rb') as handle:
+                    pkl = pickle.load(handle)
+                if pkl.get('key') == key:
+                    return pkl['capabilities']
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+                pass
+
+        capabilities, complete = probe_capabilities(self.ffmpeg)
+        if not complete:
+            # not cached, the next start probes again instead of keeping the empty sets
+            logger.debug('The ffmpeg probe failed, its capabilities are not cached.')
+        elif self.cache_path is not None:
+            try:
+                tmp_path = self.cache_path + '.tmp'
+                with open(tmp_path, 'wb') as handle:
+                    pickle.dump({'key': key, 'capabilities': capabilities}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                logger.debug(f'Could not store the toolchain cache: {e}')
+        return capabilities
+
+
+def get_toolchain(config_dir=None):
+    """
+    Return the toolchain shared by all the scrapers (located on the first call).
+
+    Raises:
+        ToolchainException: ffmpeg is not installed
+    """
+    global _toolchain
+
+    with _toolchain_lock:
+        if _toolchain is None:
+            _toolchain = Toolchain(config_dir)
+    return _toolchain
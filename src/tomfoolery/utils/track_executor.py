@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .multithreading import emit_signal
+
+DEFAULT_MAX_WORKERS = 4
+MAX_WORKERS_LIMIT = 16
+
+
+class TrackExecutor:
+    """
+    Bounded per-track executor shared by the scrapers.
+
+    Runs one job per track on a thread pool, so that several tracks are resolved,
+    downloaded and tagged at the same time. Every job keeps its own track index,
+    hence the per-row signals still reach the right row of the tracklist.
+
+    """
+    def __init__(self, cfg=None, max_workers=None):
+
+        if max_workers is None and cfg is not None:
+            max_workers = cfg.vargs.get('maxWorkers')
+        if not max_workers:
+            max_workers = DEFAULT_MAX_WORKERS
+
+        self.max_workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT))
+
+    def run(self, fn, tasks, **kwargs):
+        """
+        Call `fn(idx, item, **kwargs)` for every `(idx, item)` pair in tasks.
+
+        A failing track does not stop the other ones: its error is shown in its
+        own row and the first error is re-raised once all the tracks are done.
+
+        Returns:
+            list: results of the successful jobs, in the order of the tasks
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return []
+
+        results = {}
+        errors = []
+
+        workers = min(self.max_workers, len(tasks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='track') as pool:
+            futures = {
+                pool.submit(fn, idx, item, **kwargs): (n, idx)
+                for n, (idx, item) in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                n, idx = futures[future]
+                try:
+                    results[n] = future.result()
+                except Exception as e:
+                    if not hasattr(e, 'idx'):
+                        try:
+                            e.idx = idx
+                        except AttributeError:
+                            pass
+                    errors.append(e)
+                    # the first error is reported by the worker thread
+                    if len(errors) > 1:
+                        report_error(e, idx, **kwargs)
+
+        if errors:
+            raise errors[0]
+
+        return [results[n] for n in sorted(results)]
+
+
+def report_error(e, idx, **kwargs):
+
+    emit_signal(kwargs, 'messagebox_set', [getattr(e, 'idx', idx), str(e)])
+    emit_signal(kwargs, 'progress_init', [getattr(e, 'idx', idx), 100])
+    emit_signal(kwargs, 'resize_window')
@@ -0,0 +1,6 @@
+#! /usr/bin/env python
+import sys
+from os.path import abspath, dirname, join
+
+# the package is not installed, tests import it from src
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'src'))
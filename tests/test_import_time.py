@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+"""
+Startup import profile: the heavy dependencies are only loaded by the scrapers.
+
+"""
+import os
+import subprocess
+import sys
+from os.path import abspath, dirname, join
+
+SRC = join(dirname(dirname(abspath(__file__))), 'src')
+
+# loaded on the first download, never by starting the UI
+LAZY_MODULES = ['mutagen', 'ffmpeg', 'tqdm', 'requests', 'urllib3', 'demjson3', 'pathvalidate']
+
+
+def loaded_modules(statement):
+    """
+    Names of LAZY_MODULES in sys.modules after running statement in a fresh interpreter.
+
+    """
+    code = (
+        'import sys\n'
+        f'{statement}\n'
+        f'print(" ".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+    )
+    env = dict(os.environ, PYTHONPATH=SRC, QT_QPA_PLATFORM='offscreen')
+    result = subprocess.run(
+        [sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def test_main_import_is_light():
+
+    assert loaded_modules('import tomfoolery.main') == []
+
+
+def test_utils_import_is_light():
+
+    assert loaded_modules('import tomfoolery.utils') == []
+
+
+def test_utils_names_resolve_on_access():
+
+    assert 'mutagen' in loaded_modules('from tomfoolery.utils import write_tags')
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+"""
+Playlist tracks of the SoundCloud scraper: errors are reported on the 0-based tracklist
+row of the track, tracks in the download history are skipped without being resolved.
+
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from tomfoolery.scrapers import scrape_soundcloud
+
+
+def make_playlist(tracks):
+
+    return SimpleNamespace(
+        id=1,
+        title='Playlist',
+        secret_token=None,
+        user=SimpleNamespace(username='Artist'),
+        tracks=[SimpleNamespace(id=100 + n, downloadable=True) for n in range(tracks)],
+    )
+
+
+def failing_download_track(failing_row, error):
+
+    def download_track(client, track, playlist_info=None, exit_on_fail=True, **kwargs):
+        assert int(playlist_info['tracknumber']) == kwargs['track_number']
+        if kwargs['track_number'] - 1 == failing_row:
+            raise error
+
+    return download_track
+
+
+@pytest.mark.parametrize('failing_row', [0, 1, 2])
+def test_error_without_idx_is_reported_on_its_row(monkeypatch, failing_row):
+
+    playlist = make_playlist(3)
+    metadata = {'trackinfo': [{'download_enabled': True} for _ in playlist.tracks]}
+    monkeypatch.setattr(
+        scrape_soundcloud, 'download_track', failing_download_track(failing_row, OSError('disk full'))
+    )
+
+    with pytest.raises(OSError) as excinfo:
+        scrape_soundcloud.download_playlist(None, playlist, metadata=metadata)
+
+    assert excinfo.value.idx == failing_row
+
+
+def test_track_in_history_is_skipped_without_resolving(monkeypatch):
+
+    playlist = make_playlist(3)
+    metadata = {'trackinfo': [{'download_enabled': True} for _ in playlist.tracks]}
+    history = SimpleNamespace(contains=lambda source, track_id: track_id == 101)
+    cfg = SimpleNamespace(config_dir=None, vargs={})
+    resolved, downloaded = [], []
+
+    def resolve_track(client, playlist, track):
+        resolved.append(track.id)
+        return track
+
+    def download_track(client, track, playlist_info=None, exit_on_fail=True, **kwargs):
+        downloaded.append(track.id)
+
+    monkeypatch.setattr(scrape_soundcloud, 'get_download_history', lambda config_dir: history)
+    monkeypatch.setattr(scrape_soundcloud, 'resolve_track', resolve_track)
+    monkeypatch.setattr(scrape_soundcloud, 'download_track', download_track)
+
+    scrape_soundcloud.download_playlist(None, playlist, metadata=metadata, cfg=cfg)
+
+    assert sorted(resolved) == [100, 102]
+    assert sorted(downloaded) == [100, 102]